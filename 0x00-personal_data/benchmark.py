@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Benchmark harness for the personal_data redaction and hashing paths.
+
+Runs filter_datum and RedactingFormatter.format over synthetic log
+messages of varying length and PII density, and hash_password/is_valid
+over a range of bcrypt costs. Each case reports ops/sec and p50/p99
+latency, and results can be saved as a baseline and compared later.
+
+Usage:
+    ./benchmark.py [-k FILTER] [--save FILE] [--compare FILE]
+"""
+
+import argparse
+import json
+import logging
+import random
+import re
+import time
+from typing import Callable, Dict, List, Sequence
+
+from encrypt_password import hash_password, is_valid
+from filtered_logger import (PII_FIELDS, RedactingFormatter, RedactionStats,
+                             filter_datum)
+
+# Number of "key=value;" pairs per message for each length class
+LENGTHS = {"short": 4, "medium": 16, "long": 64}
+DENSITIES = (0.0, 0.1, 0.5, 1.0)
+BCRYPT_COSTS = (4, 6, 8, 10, 12)
+NON_PII_FIELDS = ('ip', 'last_login', 'user_agent', 'path', 'status')
+
+
+class LegacyRedactingFormatter(logging.Formatter):
+    """ Original formatter running one re.sub per field. """
+
+    def __init__(self, fields: List[str]):
+        """
+        Initialize the formatter with fields to redact.
+        """
+        super().__init__(RedactingFormatter.FORMAT)
+        self.fields = fields
+
+    def format(self, record: logging.LogRecord) -> str:
+        """
+        Formats a record, then redacts each field with its own scan.
+        """
+        message = super().format(record)
+        for field in self.fields:
+            message = re.sub(
+                rf'{field}=[^;]*;', f'{field}={RedactingFormatter.REDACTION};',
+                message)
+        return message
+
+
+def make_messages(count: int, pairs: int, density: float,
+                  seed: int = 0) -> List[str]:
+    """
+    Builds synthetic "key=value;" log messages.
+
+    Args:
+        count (int): Number of messages to build.
+        pairs (int): Number of key=value pairs per message.
+        density (float): Share of pairs whose key is a PII field.
+        seed (int): Seed for the random generator.
+
+    Returns:
+        List[str]: The generated messages.
+    """
+    rng = random.Random(seed)
+    messages = []
+    for i in range(count):
+        parts = []
+        for j in range(pairs):
+            fields = PII_FIELDS if rng.random() < density else NON_PII_FIELDS
+            parts.append("{}=value{}-{};".format(rng.choice(fields), i, j))
+        messages.append("".join(parts))
+    return messages
+
+
+def make_free_text(count: int, density: float,
+                   seed: int = 0) -> List[str]:
+    """
+    Builds free-text messages, a share of which mention PII values.
+
+    Args:
+        count (int): Number of messages to build.
+        density (float): Share of messages containing an email, phone
+            number or SSN.
+        seed (int): Seed for the random generator.
+
+    Returns:
+        List[str]: The generated messages.
+    """
+    rng = random.Random(seed)
+    values = ("user{}@example.com", "(555) 010-{:04d}", "000-12-{:04d}")
+    messages = []
+    for i in range(count):
+        text = "request {} served in {}ms for client 10.0.0.{}".format(
+            i, i % 50, i % 100)
+        if rng.random() < density:
+            text += " contact " + rng.choice(values).format(i % 10000)
+        messages.append(text)
+    return messages
+
+
+def make_records(messages: Sequence[str]) -> List[logging.LogRecord]:
+    """
+    Wraps messages into log records for the formatter cases.
+    """
+    return [logging.LogRecord("user_data", logging.INFO, __file__, 0,
+                              message, None, None) for message in messages]
+
+
+def measure(func: Callable, inputs: Sequence[tuple],
+            min_time: float) -> Dict[str, float]:
+    """
+    Times func over the inputs until at least min_time seconds pass.
+
+    Args:
+        func (Callable): The operation to time.
+        inputs (Sequence[tuple]): Positional arguments for each call.
+        min_time (float): Minimum total measuring time in seconds.
+
+    Returns:
+        Dict[str, float]: ops/sec and p50/p99 latency in microseconds.
+    """
+    clock = time.perf_counter_ns
+    latencies = []
+    deadline = time.perf_counter() + min_time
+    while True:
+        for args in inputs:
+            start = clock()
+            func(*args)
+            latencies.append(clock() - start)
+        if time.perf_counter() >= deadline:
+            break
+    latencies.sort()
+    count = len(latencies)
+    return {
+        "ops": count * 1e9 / sum(latencies),
+        "p50": latencies[count // 2] / 1e3,
+        "p99": latencies[min(count - 1, count * 99 // 100)] / 1e3,
+    }
+
+
+def redaction_cases(count: int) -> Dict[str, tuple]:
+    """
+    Returns the redaction cases as {name: (func, inputs)}.
+    """
+    current = RedactingFormatter(fields=PII_FIELDS)
+    legacy = LegacyRedactingFormatter(fields=PII_FIELDS)
+    values = RedactingFormatter(fields=PII_FIELDS, scan_values=True)
+    counted = RedactingFormatter(fields=PII_FIELDS, stats=RedactionStats())
+    cases = {}
+    for length, pairs in LENGTHS.items():
+        for density in DENSITIES:
+            messages = make_messages(count, pairs, density)
+            records = [(r,) for r in make_records(messages)]
+            suffix = "[{},pii={:.0%}]".format(length, density)
+            cases["filter_datum" + suffix] = (
+                filter_datum,
+                [(PII_FIELDS, "***", m, ";") for m in messages])
+            cases["format" + suffix] = (current.format, records)
+            cases["format_legacy" + suffix] = (legacy.format, records)
+            cases["format_values" + suffix] = (values.format, records)
+            cases["format_stats" + suffix] = (counted.format, records)
+    for density in DENSITIES:
+        records = [(r,) for r in make_records(make_free_text(count, density))]
+        suffix = "[free_text,pii={:.0%}]".format(density)
+        cases["format" + suffix] = (current.format, records)
+        cases["format_values" + suffix] = (values.format, records)
+    return cases
+
+
+def hashing_cases(costs: Sequence[int]) -> Dict[str, tuple]:
+    """
+    Returns the bcrypt cases as {name: (func, inputs)}.
+    """
+    password = "MyAmazingPassw0rd"
+    cases = {
+        "hash_password": (hash_password, [(password,)]),
+        "is_valid": (is_valid, [(hash_password(password), password)]),
+    }
+    for cost in costs:
+        cases["hash_password[cost={}]".format(cost)] = (
+            hash_password, [(password, cost)])
+        cases["is_valid[cost={}]".format(cost)] = (
+            is_valid, [(hash_password(password, cost), password)])
+    return cases
+
+
+def main():
+    """
+    Runs the selected cases and prints or stores their results.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument('-k', '--filter', default="",
+                        help="only run cases whose name contains this")
+    parser.add_argument('-n', '--messages', type=int, default=1000,
+                        help="synthetic messages per redaction case")
+    parser.add_argument('-t', '--min-time', type=float, default=0.5,
+                        help="minimum seconds measured per case")
+    parser.add_argument('--costs', default=",".join(map(str, BCRYPT_COSTS)),
+                        help="comma-separated bcrypt costs")
+    parser.add_argument('--save', help="write results to a JSON baseline")
+    parser.add_argument('--compare', help="compare against a JSON baseline")
+    args = parser.parse_args()
+
+    cases = redaction_cases(args.messages)
+    cases.update(hashing_cases([int(c) for c in args.costs.split(',')]))
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    results = {}
+    print("{:<36} {:>12} {:>10} {:>10} {:>8}".format(
+        "case", "ops/sec", "p50 us", "p99 us", "vs base"))
+    for name, (func, inputs) in cases.items():
+        if args.filter not in name:
+            continue
+        result = measure(func, inputs, args.min_time)
+        results[name] = result
+        delta = ""
+        if name in baseline:
+            delta = "{:+.1%}".format(result["ops"] / baseline[name]["ops"] - 1)
+        print("{:<36} {:>12,.0f} {:>10.2f} {:>10.2f} {:>8}".format(
+            name, result["ops"], result["p50"], result["p99"], delta))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
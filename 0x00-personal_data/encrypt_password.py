@@ -3,15 +3,27 @@
 Module for password hashing and validation using bcrypt
 """
 
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Tuple
+
 import bcrypt
 
+# bcrypt work factor used by hash_password (bcrypt's own default is 12)
+ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+MIN_ROUNDS = 4
+MAX_ROUNDS = 31
+
 
-def hash_password(password: str) -> bytes:
+def hash_password(password: str, rounds: int = None) -> bytes:
     """
     Hash a password with a salted bcrypt hash.
 
     Args:
         password (str): The password to hash.
+        rounds (int): The bcrypt work factor (defaults to ROUNDS).
 
     Returns:
         bytes: The salted, hashed password.
@@ -19,10 +31,50 @@ def hash_password(password: str) -> bytes:
     # Encode the password to bytes
     password_bytes = password.encode('utf-8')
     # Generate a salt and hash the password
-    hashed_password = bcrypt.hashpw(password_bytes, bcrypt.gensalt())
+    hashed_password = bcrypt.hashpw(
+        password_bytes, bcrypt.gensalt(rounds or ROUNDS))
     return hashed_password
 
 
+def hash_passwords(passwords: Iterable[str], rounds: int = None,
+                   workers: int = None,
+                   progress: Callable[[int], None] = None) -> Iterator[bytes]:
+    """
+    Hash many passwords across a pool of worker threads.
+
+    bcrypt releases the GIL while hashing, so threads scale with the
+    cores. Hashes are yielded in input order as soon as they are ready,
+    and only a few passwords per worker are read ahead of the consumer.
+
+    Args:
+        passwords (Iterable[str]): The passwords to hash.
+        rounds (int): The bcrypt work factor (defaults to ROUNDS).
+        workers (int): Number of threads (defaults to the CPU count).
+        progress (Callable[[int], None]): Called with the number of
+            hashes yielded so far.
+
+    Yields:
+        bytes: The salted, hashed password for each input.
+    """
+    workers = workers or os.cpu_count() or 1
+    done = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for password in passwords:
+            pending.append(pool.submit(hash_password, password, rounds))
+            if len(pending) < workers * 2:
+                continue
+            yield pending.popleft().result()
+            done += 1
+            if progress is not None:
+                progress(done)
+        while pending:
+            yield pending.popleft().result()
+            done += 1
+            if progress is not None:
+                progress(done)
+
+
 def is_valid(hashed_password: bytes, password: str) -> bool:
     """
     Check if the provided password matches the hashed password.
@@ -40,10 +92,109 @@ def is_valid(hashed_password: bytes, password: str) -> bool:
     return bcrypt.checkpw(password_bytes, hashed_password)
 
 
+def hash_rounds(hashed_password: bytes) -> int:
+    """
+    Read the work factor stored in a bcrypt hash.
+
+    Args:
+        hashed_password (bytes): A hash such as b"$2b$12$...".
+
+    Returns:
+        int: The work factor the hash was made with.
+    """
+    return int(hashed_password.split(b'$')[2])
+
+
+def needs_rehash(hashed_password: bytes, rounds: int = None) -> bool:
+    """
+    Check if a hash was made with another work factor than configured.
+
+    Args:
+        hashed_password (bytes): The stored hash.
+        rounds (int): The expected work factor (defaults to ROUNDS).
+
+    Returns:
+        bool: True if the hash should be upgraded or downgraded.
+    """
+    return hash_rounds(hashed_password) != (rounds or ROUNDS)
+
+
+def check_password(hashed_password: bytes, password: str,
+                   rounds: int = None) -> Tuple[bool, bool]:
+    """
+    Validate a password and tell whether its hash should be replaced.
+
+    Call hash_password on the plain password and store the new hash when
+    the second value is True; this is the only time it is available.
+
+    Args:
+        hashed_password (bytes): The hashed password to check against.
+        password (str): The password to validate.
+        rounds (int): The expected work factor (defaults to ROUNDS).
+
+    Returns:
+        Tuple[bool, bool]: Whether the password is valid, and whether
+        the hash needs rehashing at the expected work factor.
+    """
+    valid = is_valid(hashed_password, password)
+    return valid, valid and needs_rehash(hashed_password, rounds)
+
+
+def hash_time(rounds: int, samples: int = 3) -> float:
+    """
+    Measure how long hashing takes on this machine.
+
+    Args:
+        rounds (int): The work factor to measure.
+        samples (int): Number of hashes timed.
+
+    Returns:
+        float: The fastest hash time in milliseconds.
+    """
+    salt = bcrypt.gensalt(rounds)
+    best = None
+    for _ in range(samples):
+        start = time.perf_counter()
+        bcrypt.hashpw(b"calibration password", salt)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def calibrate_rounds(target_ms: float, samples: int = 3,
+                     apply: bool = False) -> int:
+    """
+    Find the highest work factor that hashes within a latency budget.
+
+    Each extra round doubles the cost, so measuring stops at the first
+    work factor over budget.
+
+    Args:
+        target_ms (float): The hash latency budget in milliseconds.
+        samples (int): Number of hashes timed per work factor.
+        apply (bool): Also make the result the configured ROUNDS.
+
+    Returns:
+        int: The recommended work factor (at least MIN_ROUNDS).
+    """
+    global ROUNDS
+
+    rounds = MIN_ROUNDS
+    while rounds < MAX_ROUNDS and hash_time(rounds + 1, samples) <= target_ms:
+        rounds += 1
+    if apply:
+        ROUNDS = rounds
+    return rounds
+
+
 # Example usage
 if __name__ == "__main__":
     import sys
 
+    if len(sys.argv) == 3 and sys.argv[1] == "--calibrate":
+        print(calibrate_rounds(float(sys.argv[2])))
+        sys.exit(0)
+
     password = "MyAmazingPassw0rd"
     encrypted_password = hash_password(password)
     print(encrypted_password)
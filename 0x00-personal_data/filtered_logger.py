@@ -3,18 +3,361 @@
 Module for logging and redacting PII fields from a database.
 """
 
+import copy
+import hashlib
+import hmac
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import random
+import sqlite3
+import threading
+import time
 import mysql.connector
-from typing import List
+from mysql.connector.errors import PoolError
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import lru_cache
+from typing import (Callable, Iterable, Iterator, List, Mapping, Pattern,
+                    Sequence, Tuple)
 import re
 
 # Define the fields considered as PII (Personally Identifiable Information)
 PII_FIELDS = ('name', 'email', 'phone', 'ssn', 'password')
 
+# Number of rows fetched from the users table per round trip
+BATCH_SIZE = 1000
+
+# Maximum number of rows a parallel export hands to one worker at a time
+SHARD_ROWS = 10000
+
+# PII recognised by value in free text, as {name: (trigger, regex)}.
+# A regex only runs on lines containing its trigger string, if any.
+# Every repetition is bounded and each alternative starts with a plain
+# character class followed by a lookbehind asserting a token start, so
+# the work per character is capped and no input can trigger runaway
+# backtracking.
+VALUE_PATTERNS = {
+    'email': ('@', r'[\w.+-](?<![\w.+-]{2})[\w.+-]{0,63}@[A-Za-z0-9-]{1,63}'
+                   r'(?:\.[A-Za-z0-9-]{1,63}){1,8}(?![\w-])'),
+    'phone': (None, r'(?:\+(?<![\w+]\+)1[ .-]?(?:\(\d{3}\)|\d{3})'
+                    r'|\((?<![\w+]\()\d{3}\)|\d(?<![\w+]\d)\d{2})'
+                    r'[ .-]?\d{3}[ .-]?\d{4}(?!\d)'),
+    'ssn': (None, r'\d(?<!\d\d)\d{2}-\d{2}-\d{4}(?!\d)'),
+}
+
+# Longest line prefix scanned for PII values, in characters
+MAX_SCAN_LENGTH = 4096
+
+
+@lru_cache(maxsize=128)
+def _fields_pattern(fields: Tuple[str, ...], separator: str) -> Pattern:
+    """
+    Compiles a single alternation pattern matching any of the fields.
+
+    The pattern is cached by (fields, separator) so that repeated calls
+    with the same field list share one compiled regex. Field names sit in
+    lookbehinds so that only the value is matched and can be replaced by
+    a literal string, without a Python callback per match.
+
+    Args:
+        fields (Tuple[str, ...]): Field names to match.
+        separator (str): The character used to separate fields.
+
+    Returns:
+        Pattern: A regex matching a field's value and its separator.
+    """
+    names = "|".join(rf'(?<={re.escape(field)}=)' for field in fields)
+    sep = re.escape(separator)
+    return re.compile(rf'(?<==)(?:{names})[^{sep}]*{sep}')
+
+
+class Pseudonymizer:
+    """
+    Replaces PII values with deterministic keyed HMAC tokens.
+
+    The same value always maps to the same token under a given key, so
+    redacted lines can still be joined by user. Tokens are memoized in a
+    bounded LRU cache whose hits and misses are exposed.
+    """
+
+    def __init__(self, key: bytes, cache_size: int = 65536,
+                 length: int = 16):
+        """
+        Initialize the pseudonymizer.
+
+        Args:
+            key (bytes): The secret HMAC key.
+            cache_size (int): Maximum number of cached tokens.
+            length (int): Number of hex digits kept per token.
+        """
+        self.key = key
+        self.cache_size = cache_size
+        self.length = length
+        self.token = lru_cache(maxsize=cache_size)(self._token)
+
+    def _token(self, value: str) -> str:
+        """
+        Computes the HMAC-SHA256 token of a value.
+        """
+        digest = hmac.new(self.key, value.encode('utf-8'), hashlib.sha256)
+        return digest.hexdigest()[:self.length]
+
+    def __reduce__(self) -> tuple:
+        """
+        Pickles the settings only; a worker process unpickles them into
+        its own shared instance and token cache.
+        """
+        return get_pseudonymizer, (self.key, self.cache_size, self.length)
+
+    @property
+    def hits(self) -> int:
+        """
+        Number of tokens served from the cache.
+        """
+        return self.token.cache_info().hits
+
+    @property
+    def misses(self) -> int:
+        """
+        Number of tokens that had to be computed.
+        """
+        return self.token.cache_info().misses
+
+
+@lru_cache(maxsize=16)
+def get_pseudonymizer(key: bytes, cache_size: int = 65536,
+                      length: int = 16) -> Pseudonymizer:
+    """
+    Returns the shared Pseudonymizer for a key, so its cache is reused.
+    """
+    return Pseudonymizer(key, cache_size, length)
+
+
+class RedactionStats:
+    """
+    Counters for redaction work: records processed, time spent and
+    matches per field. Shared by any number of redactors and threads.
+    """
+
+    def __init__(self):
+        """
+        Initialize empty counters.
+        """
+        self._lock = threading.Lock()
+        self.records = 0
+        self.nanoseconds = 0
+        self.matches = Counter()
+
+    def add(self, fields: Iterable[str], nanoseconds: int):
+        """
+        Records one processed message.
+
+        Args:
+            fields (Iterable[str]): The field of each match, repeated.
+            nanoseconds (int): Time spent redacting the message.
+        """
+        with self._lock:
+            self.records += 1
+            self.nanoseconds += nanoseconds
+            self.matches.update(fields)
+
+    def reset(self):
+        """
+        Clears every counter.
+        """
+        with self._lock:
+            self.records = 0
+            self.nanoseconds = 0
+            self.matches.clear()
+
+    def snapshot(self) -> dict:
+        """
+        Returns a consistent copy of the counters.
+        """
+        with self._lock:
+            return {
+                'records': self.records,
+                'nanoseconds': self.nanoseconds,
+                'matches': dict(self.matches),
+            }
+
+    def to_json(self) -> str:
+        """
+        Returns the counters as a JSON document.
+        """
+        return json.dumps(self.snapshot(), sort_keys=True)
+
+    def __str__(self) -> str:
+        """
+        Returns the counters as a single text line.
+        """
+        snapshot = self.snapshot()
+        matches = " ".join(
+            f"{field}={count}"
+            for field, count in sorted(snapshot['matches'].items()))
+        return "records={} redact_ms={:.3f} {}".format(
+            snapshot['records'], snapshot['nanoseconds'] / 1e6,
+            matches).rstrip()
+
+
+class Redactor:
+    """ Redacts a fixed set of fields in a single pass over a message. """
+
+    def __init__(self, fields: Sequence[str], redaction: str,
+                 separator: str, pseudonymizer: Pseudonymizer = None,
+                 stats: RedactionStats = None):
+        """
+        Initialize the redactor with the fields to obfuscate.
+
+        Args:
+            fields (Sequence[str]): Field names to be obfuscated.
+            redaction (str): The string to replace sensitive information with.
+            separator (str): The character used to separate fields.
+            pseudonymizer (Pseudonymizer): Replace values with HMAC tokens
+                instead of the redaction string.
+            stats (RedactionStats): Counters to record work into; when
+                None, no instrumentation code runs.
+        """
+        self.fields = tuple(fields)
+        self.redaction = redaction
+        self.separator = separator
+        self.pattern = None
+        self._keys = tuple(field + "=" for field in self.fields)
+        self._field_set = frozenset(self.fields)
+        if self.fields:
+            self.pattern = _fields_pattern(self.fields, separator)
+        self.pseudonymizer = pseudonymizer
+        self.stats = stats
+        self._replacement = (redaction + separator).replace('\\', r'\\')
+        if pseudonymizer is not None:
+            self._replacement = self._pseudonymize
+
+    def redact(self, message: str) -> str:
+        """
+        Obfuscates every configured field of a message in one scan.
+
+        Args:
+            message (str): The log message to be processed.
+
+        Returns:
+            str: The log message with obfuscated fields.
+        """
+        if self.stats is not None:
+            return self._redact_counted(message)
+        if self.pattern is None or not self.has_fields(message):
+            return message
+        return self.pattern.sub(self._replacement, message)
+
+    def _redact_counted(self, message: str) -> str:
+        """
+        Redacts a message while recording timing and per-field matches.
+        """
+        start = time.perf_counter_ns()
+        hits = []
+
+        def replace(match):
+            hits.append(self._field_at(match))
+            if self.pseudonymizer is not None:
+                return self._pseudonymize(match)
+            return self.redaction + self.separator
+
+        if self.pattern is not None and self.has_fields(message):
+            message = self.pattern.sub(replace, message)
+        self.stats.add(hits, time.perf_counter_ns() - start)
+        return message
+
+    def _field_at(self, match: re.Match) -> str:
+        """
+        Returns the field whose value a match covers.
+        """
+        key_end = match.start()
+        for key, field in zip(self._keys, self.fields):
+            if match.string.endswith(key, 0, key_end):
+                return field
+        return None
+
+    def has_fields(self, message: str) -> bool:
+        """
+        Cheaply checks whether a message contains any "field=" token.
+
+        Plain substring searches over the handful of keys run in C and
+        are faster than a pure Python multi-pattern automaton, so lines
+        without PII skip the regex substitution entirely.
+
+        Args:
+            message (str): The log message to be checked.
+
+        Returns:
+            bool: True if at least one field key appears in the message.
+        """
+        for key in self._keys:
+            if key in message:
+                return True
+        return False
+
+    def _pseudonymize(self, match: re.Match) -> str:
+        """
+        Returns the token for a matched value and its separator.
+        """
+        value = match.group()[:-len(self.separator)]
+        return self.pseudonymizer.token(value) + self.separator
+
+    def render(self, data: Mapping) -> str:
+        """
+        Renders a mapping as "key=value;" pairs, masking fields by key.
+
+        No regex runs: values of configured fields are replaced by the
+        redaction string before the message is built.
+
+        Args:
+            data (Mapping): The structured log data.
+
+        Returns:
+            str: The rendered, redacted message.
+        """
+        if self.stats is None:
+            return self._render(data)
+        start = time.perf_counter_ns()
+        message = self._render(data)
+        self.stats.add([k for k in data if k in self._field_set],
+                       time.perf_counter_ns() - start)
+        return message
+
+    def _render(self, data: Mapping) -> str:
+        """
+        Renders a mapping, masking configured fields.
+        """
+        fields = self._field_set
+        redaction = self.redaction
+        separator = self.separator
+        if self.pseudonymizer is not None:
+            token = self.pseudonymizer.token
+            return " ".join(
+                f"{k}={token(str(v)) if k in fields else v}{separator}"
+                for k, v in data.items())
+        return " ".join(
+            f"{k}={redaction if k in fields else v}{separator}"
+            for k, v in data.items())
+
+
+@lru_cache(maxsize=128)
+def _get_redactor(fields: Tuple[str, ...], redaction: str, separator: str,
+                  pseudonymizer: Pseudonymizer = None,
+                  stats: RedactionStats = None) -> Redactor:
+    """
+    Returns a cached Redactor for the given settings.
+    """
+    return Redactor(fields, redaction, separator, pseudonymizer, stats)
+
 
 def filter_datum(fields: List[
-        str], redaction: str, message: str, separator: str) -> str:
+        str], redaction: str, message: str, separator: str,
+        pseudonymizer: Pseudonymizer = None,
+        stats: RedactionStats = None) -> str:
     """
     Obfuscates specified fields in a log message.
 
@@ -23,15 +366,83 @@ def filter_datum(fields: List[
         redaction (str): The string to replace sensitive information with.
         message (str): The log message to be processed.
         separator (str): The character used to separate fields in the message.
+        pseudonymizer (Pseudonymizer): Replace values with HMAC tokens
+            instead of the redaction string.
+        stats (RedactionStats): Counters to record matches and timing.
 
     Returns:
         str: The log message with obfuscated fields.
     """
-    for field in fields:
-        pattern = rf'{field}=[^;]*{separator}'
-        replacement = f'{field}={redaction}{separator}'
-        message = re.sub(pattern, replacement, message)
-    return message
+    return _get_redactor(tuple(fields), redaction, separator,
+                         pseudonymizer, stats).redact(message)
+
+
+class ValueScanner:
+    """
+    Redacts PII recognised by its value rather than by its field name.
+
+    Only the first max_length characters of a line are scanned; the rest
+    of a longer line is replaced by the redaction string, so the
+    worst-case cost per line is fixed.
+    """
+
+    def __init__(self, redaction: str, max_length: int = MAX_SCAN_LENGTH,
+                 patterns: Mapping[str, tuple] = VALUE_PATTERNS):
+        """
+        Initialize the scanner.
+
+        Args:
+            redaction (str): The string to replace sensitive information with.
+            max_length (int): Longest line prefix scanned, in characters.
+            patterns (Mapping[str, tuple]): {name: (trigger, regex)} for
+                the PII values to find.
+        """
+        self.redaction = redaction
+        self.max_length = max_length
+        # One combined regex per trigger; triggered ones run first so that
+        # e.g. the digits of "5551234567@x.com" are not taken as a phone
+        grouped = {}
+        for trigger, pattern in patterns.values():
+            grouped.setdefault(trigger, []).append(f"(?:{pattern})")
+        self.patterns = tuple(
+            (trigger, re.compile("|".join(grouped[trigger])))
+            for trigger in sorted(grouped, key=lambda t: t is None))
+        self._replacement = redaction.replace('\\', r'\\')
+
+    def scan(self, message: str) -> str:
+        """
+        Redacts PII values on every line of a message.
+
+        Args:
+            message (str): The log message to be processed.
+
+        Returns:
+            str: The message with PII values replaced.
+        """
+        if "\n" in message:
+            return "\n".join(
+                self.scan_line(line) for line in message.split("\n"))
+        return self.scan_line(message)
+
+    def scan_line(self, line: str) -> str:
+        """
+        Redacts PII values in a single line, up to the length cap.
+        """
+        if len(line) <= self.max_length:
+            return self._sub(line)
+        # Cut at a token boundary so no value is split across the cap
+        head = line[:self.max_length]
+        cut = max(head.rfind(" "), head.rfind(";")) + 1
+        return self._sub(head[:cut or self.max_length]) + self.redaction
+
+    def _sub(self, line: str) -> str:
+        """
+        Runs each pattern whose trigger appears in the line.
+        """
+        for trigger, pattern in self.patterns:
+            if trigger is None or trigger in line:
+                line = pattern.sub(self._replacement, line)
+        return line
 
 
 class RedactingFormatter(logging.Formatter):
@@ -41,61 +452,525 @@ class RedactingFormatter(logging.Formatter):
     FORMAT = "[HOLBERTON] %(name)s %(levelname)s %(asctime)-15s: %(message)s"
     SEPARATOR = ";"
 
-    def __init__(self, fields: List[str]):
+    def __init__(self, fields: List[str], scan_values: bool = False,
+                 max_scan: int = MAX_SCAN_LENGTH,
+                 pseudonymizer: Pseudonymizer = None,
+                 stats: RedactionStats = None):
         """
         Initialize the formatter with fields to redact.
+
+        Args:
+            fields (List[str]): Field names to be obfuscated.
+            scan_values (bool): Also redact emails, phone numbers and SSNs
+                found anywhere in the line.
+            max_scan (int): Longest line prefix scanned for values; the
+                rest of a longer line is redacted.
+            pseudonymizer (Pseudonymizer): Replace field values with HMAC
+                tokens instead of the redaction string.
+            stats (RedactionStats): Counters to record matches and timing.
         """
         super().__init__(self.FORMAT)
         self.fields = fields
+        self.stats = stats
+        self._redactor = Redactor(
+            fields, self.REDACTION, self.SEPARATOR, pseudonymizer, stats)
+        self._scanner = None
+        if scan_values:
+            self._scanner = ValueScanner(self.REDACTION, max_scan)
 
     def format(self, record: logging.LogRecord) -> str:
         """
         Filters values in incoming log records using filter_datum.
 
+        A record whose message is a mapping, or a list of mappings logged
+        one per line, is masked by key lookup while it is rendered
+        instead of being rendered and then scanned.
+
         Args:
             record (logging.LogRecord): Log record containing the message.
 
         Returns:
             str: The formatted and redacted log message.
         """
+        if is_structured(record):
+            record = copy.copy(record)
+            if isinstance(record.msg, Mapping):
+                record.msg = self._redactor.render(record.msg)
+            else:
+                record.msg = "\n".join(
+                    self._redactor.render(data) for data in record.msg)
+            record.args = None
+            if not (record.exc_info or record.exc_text or record.stack_info):
+                return self._scan(super().format(record))
         original_message = super().format(record)
-        return filter_datum(
-            self.fields, self.REDACTION, original_message, self.SEPARATOR)
+        return self._scan(self._redactor.redact(original_message))
+
+    def _scan(self, message: str) -> str:
+        """
+        Redacts PII values when value scanning is enabled.
+        """
+        if self._scanner is None:
+            return message
+        return self._scanner.scan(message)
+
+
+def is_structured(record: logging.LogRecord) -> bool:
+    """
+    Checks whether a record carries a mapping, or a list of mappings,
+    as its message.
+    """
+    if record.args:
+        return False
+    msg = record.msg
+    if isinstance(msg, Mapping):
+        return True
+    return isinstance(msg, list) and bool(msg) and isinstance(
+        msg[0], Mapping)
+
+
+class _BlockingQueueListener(logging.handlers.QueueListener):
+    """ Queue listener that waits for room to enqueue its sentinel. """
+
+    def enqueue_sentinel(self):
+        """
+        Blocks until the stop sentinel fits in a bounded queue.
+        """
+        self.queue.put(self._sentinel)
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """
+    Handler that hands records to a background listener thread.
+
+    The caller's thread only pays for putting the record on a bounded
+    queue; redaction and the blocking write happen on the listener.
+    """
+
+    def __init__(self, handler: logging.Handler, maxsize: int = 10000,
+                 block: bool = False):
+        """
+        Initialize the handler and start its listener thread.
+
+        Args:
+            handler (logging.Handler): Handler that formats and writes.
+            maxsize (int): Maximum number of queued records.
+            block (bool): Wait for room when the queue is full instead of
+                dropping the record.
+        """
+        super().__init__(queue.Queue(maxsize))
+        self.block = block
+        self.dropped = 0
+        self.listener = _BlockingQueueListener(self.queue, handler)
+        self.listener.start()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Prepares a record for the queue.
+
+        Structured records are passed through unrendered so that the
+        redacting formatter still sees their fields.
+        """
+        if is_structured(record):
+            record = copy.copy(record)
+            if record.exc_info:
+                record.exc_text = logging.Formatter().formatException(
+                    record.exc_info)
+                record.exc_info = None
+            return record
+        return super().prepare(record)
+
+    def enqueue(self, record: logging.LogRecord):
+        """
+        Queues a record, blocking or dropping it when the queue is full.
+
+        Args:
+            record (logging.LogRecord): The prepared log record.
+        """
+        if self.block:
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """
+        Flushes the queued records and stops the listener thread.
+        """
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        super().close()
+
+
+class DroppingFilter(logging.Filter, ABC):
+    """
+    Base class for logger filters that drop records before formatting.
+
+    Attached to a logger, filters run in Logger.handle before any handler
+    or RedactingFormatter sees the record. Dropped records are counted
+    and, once per interval, a summary line is logged by the next record
+    that reaches the filter, whether it is kept or dropped, so drops are
+    reported even when nothing gets through.
+    """
+
+    def __init__(self, summary_interval: float = 60.0):
+        """
+        Initialize the drop counters.
+
+        Args:
+            summary_interval (float): Seconds between summary lines.
+        """
+        super().__init__()
+        self.summary_interval = summary_interval
+        self.dropped = Counter()
+        self._lock = threading.Lock()
+        self._last_summary = time.monotonic()
+
+    @abstractmethod
+    def keep(self, record: logging.LogRecord) -> bool:
+        """
+        Decides whether a record is kept. Implemented by subclasses.
+        """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """
+        Keeps or drops a record, reporting drops once per interval.
+
+        Args:
+            record (logging.LogRecord): The record being logged.
+
+        Returns:
+            bool: True if the record should be logged.
+        """
+        if getattr(record, 'drop_summary', False):
+            return True
+        with self._lock:
+            kept = self.keep(record)
+            if not kept:
+                self.dropped[record.levelname] += 1
+            summary = self._summary(record)
+        if summary is not None:
+            logging.getLogger(record.name).handle(summary)
+        return kept
+
+    def _summary(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Builds the summary record when the interval has elapsed.
+        """
+        now = time.monotonic()
+        elapsed = now - self._last_summary
+        if elapsed < self.summary_interval or not self.dropped:
+            return None
+        counts = ", ".join(
+            f"{level}={count}" for level, count in sorted(
+                self.dropped.items()))
+        self.dropped.clear()
+        self._last_summary = now
+        return logging.makeLogRecord({
+            'name': record.name,
+            'levelno': logging.WARNING,
+            'levelname': logging.getLevelName(logging.WARNING),
+            'msg': "{} dropped records in the last {:.0f}s: {}".format(
+                type(self).__name__, elapsed, counts),
+            'drop_summary': True,
+        })
 
 
-def get_logger() -> logging.Logger:
+class SamplingFilter(DroppingFilter):
+    """ Keeps a random share of the records of each level. """
+
+    def __init__(self, ratios: Mapping[int, float],
+                 summary_interval: float = 60.0):
+        """
+        Initialize the sampler.
+
+        Args:
+            ratios (Mapping[int, float]): Share of records kept per level,
+                e.g. {logging.INFO: 0.1}. Other levels are all kept.
+            summary_interval (float): Seconds between summary lines.
+        """
+        super().__init__(summary_interval)
+        self.ratios = dict(ratios)
+
+    def keep(self, record: logging.LogRecord) -> bool:
+        """
+        Keeps the record with its level's probability.
+        """
+        ratio = self.ratios.get(record.levelno, 1.0)
+        return ratio >= 1.0 or random.random() < ratio
+
+
+class RateLimitFilter(DroppingFilter):
+    """
+    Token-bucket rate limit keyed by logger name or message template.
+    """
+
+    MAX_KEYS = 10000
+
+    def __init__(self, rate: float, burst: int, key: str = "logger",
+                 summary_interval: float = 60.0):
+        """
+        Initialize the rate limiter.
+
+        Args:
+            rate (float): Records allowed per second and key.
+            burst (int): Records allowed at once after a quiet period.
+            key (str): "logger" for one bucket per logger, or "template"
+                for one bucket per unformatted message.
+            summary_interval (float): Seconds between summary lines.
+        """
+        super().__init__(summary_interval)
+        if key not in ("logger", "template"):
+            raise ValueError("key must be 'logger' or 'template'")
+        self.rate = rate
+        self.burst = burst
+        self.key = key
+        # key -> [tokens, last refill], least recently used first
+        self._buckets = OrderedDict()
+
+    def keep(self, record: logging.LogRecord) -> bool:
+        """
+        Takes a token from the record's bucket if one is available.
+        """
+        key = record.name
+        if self.key == "template" and isinstance(record.msg, str):
+            key = record.msg
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(self.burst), now]
+            if len(self._buckets) > self.MAX_KEYS:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(
+                self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] < 1.0:
+            return False
+        bucket[0] -= 1.0
+        return True
+
+
+def get_logger(queued: bool = False, queue_size: int = 10000,
+               block: bool = False,
+               pseudonymizer: Pseudonymizer = None,
+               filters: Sequence[logging.Filter] = ()) -> logging.Logger:
     """
     Creates and returns a logger named 'user_data' with custom settings.
 
+    Args:
+        queued (bool): Format and write records on a background thread.
+        queue_size (int): Maximum number of pending records when queued.
+        block (bool): When queued, wait for room in a full queue instead
+            of dropping the record.
+        pseudonymizer (Pseudonymizer): Replace PII values with HMAC
+            tokens instead of the redaction string.
+        filters (Sequence[logging.Filter]): Logger filters, such as
+            SamplingFilter or RateLimitFilter, run before formatting.
+
     Returns:
         logging.Logger: A configured logger that redacts PII fields.
     """
     logger = logging.getLogger("user_data")
     logger.setLevel(logging.INFO)
     logger.propagate = False
+    for log_filter in filters:
+        logger.addFilter(log_filter)
 
     handler = logging.StreamHandler()
-    formatter = RedactingFormatter(fields=PII_FIELDS)
+    formatter = RedactingFormatter(
+        fields=PII_FIELDS, pseudonymizer=pseudonymizer)
     handler.setFormatter(formatter)
+    if queued:
+        # Closed before the stream handler by logging.shutdown at exit
+        handler = BoundedQueueHandler(handler, queue_size, block)
     logger.addHandler(handler)
 
     return logger
 
 
-def get_db() -> mysql.connector.connection.MySQLConnection:
+class _SQLiteCursor(sqlite3.Cursor):
+    """ SQLite cursor exposing column_names like mysql.connector. """
+
+    @property
+    def column_names(self) -> Tuple[str, ...]:
+        """
+        Returns the column names of the last query.
+        """
+        return tuple(column[0] for column in self.description or ())
+
+    def execute(self, operation: str, params: Sequence = ()):
+        """
+        Executes a query written with mysql.connector's %s placeholders.
+        """
+        if params:
+            operation = operation.replace("%s", "?")
+        return super().execute(operation, params)
+
+
+class _SQLiteConnection(sqlite3.Connection):
+    """ SQLite connection whose cursors mimic mysql.connector's. """
+
+    def cursor(self, factory=_SQLiteCursor) -> _SQLiteCursor:
+        """
+        Returns a cursor exposing column_names.
+        """
+        return super().cursor(factory)
+
+    def is_connected(self) -> bool:
+        """
+        Checks that the connection is still usable.
+        """
+        try:
+            self.execute("SELECT 1;")
+        except sqlite3.Error:
+            return False
+        return True
+
+
+class PooledConnection:
+    """ Connection proxy whose close() returns it to its pool. """
+
+    def __init__(self, pool: 'ConnectionPool', connection):
+        """
+        Wrap a connection checked out of a pool.
+        """
+        self._pool = pool
+        self._connection = connection
+
+    def __getattr__(self, name: str):
+        """
+        Delegates everything else to the wrapped connection.
+        """
+        if self._connection is None:
+            raise PoolError("Connection already returned to the pool")
+        return getattr(self._connection, name)
+
+    def close(self):
+        """
+        Returns the connection to its pool instead of closing it.
+        """
+        if self._connection is not None:
+            self._pool.put(self._connection)
+            self._connection = None
+
+
+class ConnectionPool:
     """
-    Returns a connector to the database using credentials
-    from environment variables.
+    Bounded pool of database connections.
 
-    Returns:
-        mysql.connector.connection.MySQLConnection: A connection to the
-        MySQL database.
+    Idle connections are health-checked when checked out and replaced if
+    they went stale. Checking out blocks for at most 'timeout' seconds
+    while all connections are in use.
+    """
+
+    def __init__(self, connect: Callable, size: int, timeout: float = 30.0):
+        """
+        Initialize an empty pool.
+
+        Args:
+            connect (Callable): Opens a new raw connection.
+            size (int): Maximum number of connections.
+            timeout (float): Seconds to wait for a free connection.
+        """
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def get(self) -> PooledConnection:
+        """
+        Checks out a healthy connection.
+
+        Raises:
+            PoolError: If no connection frees up within the timeout.
+
+        Returns:
+            PooledConnection: A connection to close() when done.
+        """
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolError("No connection available after {}s".format(
+                self.timeout))
+        try:
+            while True:
+                try:
+                    connection = self._idle.get_nowait()
+                except queue.Empty:
+                    connection = self._connect()
+                    break
+                if connection.is_connected():
+                    break
+                self._discard(connection)
+        except Exception:
+            self._slots.release()
+            raise
+        return PooledConnection(self, connection)
+
+    def put(self, connection):
+        """
+        Returns a connection to the idle set.
+
+        Its transaction is rolled back first, which also drains any
+        unread result, so the next user neither reads the old snapshot
+        nor inherits pending rows. A connection that fails to roll back
+        is closed instead.
+        """
+        try:
+            connection.rollback()
+        except Exception:
+            self._discard(connection)
+        else:
+            self._idle.put(connection)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """
+        Closes every idle connection.
+        """
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+    @staticmethod
+    def _discard(connection):
+        """
+        Closes a connection, ignoring errors from dead ones.
+        """
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _connect() -> mysql.connector.connection.MySQLConnection:
+    """
+    Opens a new connection to the configured database backend.
+
+    PERSONAL_DATA_DB_BACKEND selects "mysql" (default) or "sqlite", a
+    local stand-in using PERSONAL_DATA_DB_NAME as the database file.
     """
     db_username = os.getenv('PERSONAL_DATA_DB_USERNAME', 'root')
     db_password = os.getenv('PERSONAL_DATA_DB_PASSWORD', '')
     db_host = os.getenv('PERSONAL_DATA_DB_HOST', 'localhost')
     db_name = os.getenv('PERSONAL_DATA_DB_NAME')
 
+    if os.getenv('PERSONAL_DATA_DB_BACKEND', 'mysql') == 'sqlite':
+        return sqlite3.connect(db_name or ':memory:',
+                               factory=_SQLiteConnection,
+                               check_same_thread=False)
+
     return mysql.connector.connect(
         user=db_username,
         password=db_password,
@@ -104,21 +979,398 @@ def get_db() -> mysql.connector.connection.MySQLConnection:
     )
 
 
-def main():
+def get_pool() -> ConnectionPool:
+    """
+    Returns this process's connection pool, creating it on first use.
+
+    The pool is sized by PERSONAL_DATA_DB_POOL_SIZE and waits at most
+    PERSONAL_DATA_DB_POOL_TIMEOUT seconds for a free connection. Forked
+    worker processes get their own pool rather than sharing sockets.
+    """
+    global _pool, _pool_pid
+
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            size = int(os.getenv('PERSONAL_DATA_DB_POOL_SIZE') or 5)
+            timeout = float(os.getenv('PERSONAL_DATA_DB_POOL_TIMEOUT', 30))
+            _pool = ConnectionPool(_connect, size, timeout)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def get_db(pooled: bool = None) -> mysql.connector.connection.MySQLConnection:
+    """
+    Returns a connector to the database using credentials
+    from environment variables.
+
+    Args:
+        pooled (bool): Check the connection out of a shared pool; closing
+            it returns it to the pool. Defaults to pooling whenever
+            PERSONAL_DATA_DB_POOL_SIZE is set.
+
+    Returns:
+        mysql.connector.connection.MySQLConnection: A connection to the
+        MySQL database.
+    """
+    if pooled is None:
+        pooled = bool(os.getenv('PERSONAL_DATA_DB_POOL_SIZE'))
+    if pooled:
+        return get_pool().get()
+    return _connect()
+
+
+def emit_messages(logger: logging.Logger, messages: List[dict],
+                  batched: bool = False):
+    """
+    Logs row messages, one record per row or per batch.
+
+    Rows are logged as structured records so that the formatter masks
+    PII fields by column name rather than scanning rendered text.
+
+    Args:
+        logger (logging.Logger): The redacting logger.
+        messages (List[dict]): The rows as {column: value} mappings.
+        batched (bool): Log the messages as a single record, one row per
+            line.
+    """
+    if batched:
+        logger.info(messages)
+        return
+    for message in messages:
+        logger.info(message)
+
+
+def users_columns(cursor) -> Tuple[str, ...]:
+    """
+    Reads the column names of the users table without fetching rows.
+    """
+    cursor.execute("SELECT * FROM users LIMIT 0;")
+    cursor.fetchall()
+    return tuple(cursor.column_names)
+
+
+def select_list(columns: Sequence[str], pushdown: str = None,
+                fields: Sequence[str] = PII_FIELDS,
+                redaction: str = RedactingFormatter.REDACTION) -> str:
+    """
+    Builds the SELECT list for the users table.
+
+    With pushdown, PII columns never leave the database in plain text:
+    "mask" selects a constant redaction literal under the column's name
+    and "omit" leaves the column out.
+
+    Args:
+        columns (Sequence[str]): The columns of the users table.
+        pushdown (str): None, "mask" or "omit".
+        fields (Sequence[str]): The PII column names.
+        redaction (str): The literal selected in place of PII values.
+
+    Returns:
+        str: The comma-separated SELECT list.
+    """
+    if pushdown is None:
+        return "*"
+    if pushdown not in ("mask", "omit"):
+        raise ValueError("pushdown must be 'mask' or 'omit'")
+    literal = "'{}'".format(redaction.replace("'", "''"))
+    selected = []
+    for column in columns:
+        if column not in fields:
+            selected.append(f"`{column}`")
+        elif pushdown == "mask":
+            selected.append(f"{literal} AS `{column}`")
+    return ", ".join(selected)
+
+
+def iter_shards(shard_rows: int = SHARD_ROWS, key: str = None,
+                pushdown: str = None) -> Iterator[tuple]:
+    """
+    Splits the users table into key ranges of at most shard_rows rows.
+
+    The key column is streamed once in index order and every
+    shard_rows-th value becomes a range boundary, so ranges hold the
+    same number of rows however the keys are spread, and each shard
+    query is an index range scan rather than a sort of the whole table.
+
+    Rows whose key is NULL are exported as one extra range first.
+
+    Args:
+        shard_rows (int): Number of rows per range (more only when a
+            boundary value is repeated).
+        key (str): Indexed column to split on.
+        pushdown (str): Redact PII columns in SQL ("mask" or "omit").
+
+    Yields:
+        tuple: (SELECT statement, boundary parameters) per range, in key
+        order.
+    """
+    db = get_db()
+    cursor = db.cursor()
+    try:
+        select = select_list(users_columns(cursor), pushdown)
+        column = f"users.`{key}`"
+        # NULLs sort first in both MySQL and SQLite
+        cursor.execute(f"SELECT {column} FROM users ORDER BY {column};")
+        low = None
+        count = 0
+        while True:
+            rows = cursor.fetchmany(shard_rows)
+            if not rows:
+                break
+            for (value,) in rows:
+                if value is None:
+                    if not count:
+                        yield (f"SELECT {select} FROM users WHERE {column} "
+                               f"IS NULL;", ())
+                    count = 1
+                    continue
+                if low is None or (count >= shard_rows and value != low):
+                    if low is not None:
+                        yield (f"SELECT {select} FROM users WHERE {column} "
+                               f">= %s AND {column} < %s ORDER BY {column};",
+                               (low, value))
+                    low = value
+                    count = 0
+                count += 1
+    finally:
+        cursor.close()
+        db.close()
+    if low is not None:
+        yield (f"SELECT {select} FROM users WHERE {column} >= %s "
+               f"ORDER BY {column};", (low,))
+
+
+def iter_chunks(shard_rows: int = SHARD_ROWS,
+                pushdown: str = None) -> Iterator[tuple]:
+    """
+    Streams the users table in chunks of at most shard_rows rows.
+
+    Used when there is no key to split on: a single unsorted SELECT is
+    read here and the chunks are handed to the workers to render.
+
+    Args:
+        shard_rows (int): Number of rows per chunk.
+        pushdown (str): Redact PII columns in SQL ("mask" or "omit").
+
+    Yields:
+        tuple: (column names, rows) for each chunk, in table order.
+    """
+    db = get_db()
+    cursor = db.cursor()
+    try:
+        select = "*"
+        if pushdown is not None:
+            select = select_list(users_columns(cursor), pushdown)
+        cursor.execute(f"SELECT {select} FROM users;")
+        fields = tuple(cursor.column_names)
+        while True:
+            rows = cursor.fetchmany(shard_rows)
+            if not rows:
+                return
+            yield fields, rows
+    finally:
+        cursor.close()
+        db.close()
+
+
+@lru_cache(maxsize=16)
+def _export_formatter(
+        pseudonymizer: Pseudonymizer = None) -> logging.Formatter:
+    """
+    Returns this process's formatter for rendering exported rows.
+    """
+    return RedactingFormatter(fields=PII_FIELDS, pseudonymizer=pseudonymizer)
+
+
+def render_rows(chunk: tuple, batched: bool = False,
+                batch_size: int = BATCH_SIZE,
+                pseudonymizer: Pseudonymizer = None) -> List[str]:
+    """
+    Renders and redacts rows into finished log lines.
+
+    Each row, or each batch of rows when batched, becomes one record
+    formatted the way get_logger's handler would format it.
+
+    Args:
+        chunk (tuple): (column names, rows) as yielded by iter_chunks.
+        batched (bool): Render each batch as a single record, one row
+            per line.
+        batch_size (int): Number of rows per batched record.
+        pseudonymizer (Pseudonymizer): Log PII values as HMAC tokens
+            instead of the redaction string.
+
+    Returns:
+        List[str]: The formatted lines, in row order.
+    """
+    fields, rows = chunk
+    formatter = _export_formatter(pseudonymizer)
+    messages = [dict(zip(fields, row)) for row in rows]
+    if batched:
+        messages = [messages[i:i + batch_size]
+                    for i in range(0, len(messages), batch_size)]
+    return [formatter.format(logging.LogRecord(
+        "user_data", logging.INFO, __file__, 0, message, None, None))
+        for message in messages]
+
+
+def render_shard(shard: tuple, batched: bool = False,
+                 batch_size: int = BATCH_SIZE,
+                 pseudonymizer: Pseudonymizer = None) -> List[str]:
+    """
+    Fetches one shard on its own connection and renders its rows.
+
+    Args:
+        shard (tuple): (SELECT statement, parameters) as yielded by
+            iter_shards.
+        batched (bool): Render each batch as a single record.
+        batch_size (int): Number of rows fetched per round trip.
+        pseudonymizer (Pseudonymizer): Log PII values as HMAC tokens.
+
+    Returns:
+        List[str]: The formatted lines, in row order.
+    """
+    db = get_db()
+    cursor = db.cursor()
+    try:
+        cursor.execute(*shard)
+        fields = cursor.column_names
+        lines = []
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return lines
+            lines.extend(render_rows((fields, rows), batched, batch_size,
+                                     pseudonymizer))
+    finally:
+        cursor.close()
+        db.close()
+
+
+def write_lines(logger: logging.Logger, lines: List[str]):
+    """
+    Writes rendered lines to the streams of a logger's handlers.
+
+    Queued handlers are written through to their listener's handlers;
+    each stream is written under its handler's lock in one call.
+    """
+    if not lines or not logger.isEnabledFor(logging.INFO):
+        return
+    handlers = []
+    for handler in logger.handlers:
+        if isinstance(handler, BoundedQueueHandler):
+            if handler.listener is not None:
+                handlers.extend(handler.listener.handlers)
+        else:
+            handlers.append(handler)
+    for handler in handlers:
+        if not isinstance(handler, logging.StreamHandler):
+            continue
+        text = handler.terminator.join(lines) + handler.terminator
+        with handler.lock:
+            handler.stream.write(text)
+            handler.flush()
+
+
+def export_sharded(logger: logging.Logger, workers: int,
+                   batch_size: int = BATCH_SIZE, batched: bool = False,
+                   ordered: bool = True, shard_rows: int = SHARD_ROWS,
+                   key: str = None, pushdown: str = None,
+                   pseudonymizer: Pseudonymizer = None):
+    """
+    Logs the users table by rendering its shards in parallel workers.
+
+    Workers fetch (given a key) or receive (otherwise) at most
+    shard_rows rows, redact and format them, and return finished lines;
+    this process only writes them to the logger's stream handlers. Lines
+    are rendered with the default RedactingFormatter, so logger filters
+    and custom handler formatters are not applied. At most two shards
+    per worker are in flight.
+
+    Args:
+        logger (logging.Logger): The redacting logger.
+        workers (int): Number of worker processes.
+        batch_size (int): Number of rows fetched per round trip, and per
+            record when batched.
+        batched (bool): Log each batch as a single record.
+        ordered (bool): Emit shards in table order (strict) or as soon
+            as each one completes (relaxed).
+        shard_rows (int): Maximum number of rows per shard.
+        key (str): Optional indexed column to split on; without one the
+            table is read here and only rendering is parallel.
+        pushdown (str): Redact PII columns in SQL ("mask" or "omit").
+        pseudonymizer (Pseudonymizer): Log PII values as HMAC tokens.
+    """
+    if key is not None:
+        shards = iter_shards(shard_rows, key, pushdown)
+        render = render_shard
+    else:
+        shards = iter_chunks(shard_rows, pushdown)
+        render = render_rows
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for shard in shards:
+            pending.append(pool.submit(
+                render, shard, batched, batch_size, pseudonymizer))
+            # Bound the rows held in memory
+            while len(pending) >= workers * 2:
+                if ordered:
+                    done = [pending.popleft()]
+                else:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        pending.remove(future)
+                for future in done:
+                    write_lines(logger, future.result())
+        while pending:
+            write_lines(logger, pending.popleft().result())
+
+
+def main(batch_size: int = BATCH_SIZE, batched: bool = False,
+         workers: int = 1, ordered: bool = True, key: str = None,
+         pushdown: str = None, pseudonymizer: Pseudonymizer = None):
     """
     Main function to connect to the database, retrieve and log user data.
+
+    Rows are streamed from the unbuffered cursor with fetchmany, so only
+    one batch is held in memory at a time. With several workers the rows
+    are rendered and redacted in parallel, see export_sharded.
+
+    Args:
+        batch_size (int): Number of rows fetched per round trip.
+        batched (bool): Log each batch as a single record, one row per
+            line.
+        workers (int): Number of worker processes fetching shards.
+        ordered (bool): With several workers, keep the table order.
+        key (str): With several workers, indexed column to split on so
+            that workers also fetch their shards.
+        pushdown (str): Redact PII columns in the SELECT itself, either
+            "mask" (constant literal) or "omit" (column left out).
+        pseudonymizer (Pseudonymizer): Log PII values as HMAC tokens
+            instead of the redaction string.
     """
+    logger = get_logger(pseudonymizer=pseudonymizer)
+    if workers > 1:
+        export_sharded(logger, workers, batch_size, batched, ordered,
+                       key=key, pushdown=pushdown,
+                       pseudonymizer=pseudonymizer)
+        return
+
     db = get_db()
-    logger = get_logger()
+    cursor = db.cursor()
 
     try:
-        cursor = db.cursor()
-        cursor.execute("SELECT * FROM users;")
+        select = "*"
+        if pushdown is not None:
+            select = select_list(users_columns(cursor), pushdown)
+        cursor.execute(f"SELECT {select} FROM users;")
         fields = cursor.column_names
 
-        for row in cursor:
-            message = " ".join(f"{k}={v};" for k, v in zip(fields, row))
-            logger.info(message.strip())
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            emit_messages(
+                logger, [dict(zip(fields, row)) for row in rows], batched)
 
     finally:
         cursor.close()
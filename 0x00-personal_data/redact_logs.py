@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Command-line tool to redact PII fields from existing log files.
+
+The input file is memory-mapped and cut into chunks on line boundaries.
+Chunks are redacted in a pool of worker processes and written back in
+their original order, with only a bounded number of chunks in flight.
+
+Usage:
+    ./redact_logs.py user_data.log -o user_data.redacted.log
+
+With --pseudonymize, values are replaced by HMAC tokens keyed by the
+PERSONAL_DATA_HMAC_KEY environment variable instead of "***".
+"""
+
+import argparse
+import mmap
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Iterator, Tuple
+
+from filtered_logger import (PII_FIELDS, RedactingFormatter, filter_datum,
+                             get_pseudonymizer)
+
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def iter_chunks(data: mmap.mmap, chunk_size: int) -> Iterator[bytes]:
+    """
+    Splits a buffer into chunks that always end on a line boundary.
+
+    Args:
+        data (mmap.mmap): The memory-mapped input.
+        chunk_size (int): The approximate size of each chunk in bytes.
+
+    Yields:
+        bytes: Consecutive chunks covering the whole buffer.
+    """
+    size = len(data)
+    start = 0
+    while start < size:
+        end = min(start + chunk_size, size)
+        if end < size:
+            newline = data.find(b'\n', end - 1)
+            end = size if newline == -1 else newline + 1
+        yield data[start:end]
+        start = end
+
+
+def redact_chunk(args: Tuple[bytes, Tuple[str, ...], str, str,
+                             bytes]) -> bytes:
+    """
+    Redacts every line of a chunk with filter_datum.
+
+    Args:
+        args (Tuple): The chunk, fields, redaction, separator and the
+            optional HMAC key.
+
+    Returns:
+        bytes: The redacted chunk.
+    """
+    chunk, fields, redaction, separator, key = args
+    # One pseudonymizer, and token cache, per worker process
+    pseudonymizer = get_pseudonymizer(key) if key else None
+    text = chunk.decode('utf-8', 'surrogateescape')
+    lines = text.split('\n')
+    redacted = '\n'.join(
+        filter_datum(fields, redaction, line, separator, pseudonymizer)
+        for line in lines)
+    return redacted.encode('utf-8', 'surrogateescape')
+
+
+def redact_file(src: str, dst: BinaryIO, fields: Tuple[str, ...],
+                redaction: str = RedactingFormatter.REDACTION,
+                separator: str = RedactingFormatter.SEPARATOR,
+                workers: int = None,
+                chunk_size: int = DEFAULT_CHUNK_SIZE,
+                key: bytes = None) -> None:
+    """
+    Redacts a log file into an output stream, preserving line order.
+
+    Args:
+        src (str): Path of the log file to redact.
+        dst (BinaryIO): Binary stream receiving the redacted output.
+        fields (Tuple[str, ...]): Field names to be obfuscated.
+        redaction (str): The string to replace sensitive information with.
+        separator (str): The character used to separate fields.
+        workers (int): Number of worker processes (defaults to CPU count).
+        chunk_size (int): The approximate size of each chunk in bytes.
+        key (bytes): HMAC key to pseudonymize values instead of redacting.
+    """
+    workers = workers or os.cpu_count() or 1
+    with open(src, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data, \
+                ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for chunk in iter_chunks(data, chunk_size):
+                pending.append(pool.submit(
+                    redact_chunk, (chunk, fields, redaction, separator, key)))
+                # Bound the chunks in flight to keep memory constant
+                if len(pending) >= workers * 2:
+                    dst.write(pending.popleft().result())
+            while pending:
+                dst.write(pending.popleft().result())
+
+
+def main():
+    """
+    Parses the command line and redacts the requested log file.
+    """
+    parser = argparse.ArgumentParser(
+        description="Redact PII fields from a log file.")
+    parser.add_argument('input', help="log file to redact")
+    parser.add_argument('-o', '--output',
+                        help="output file (defaults to stdout)")
+    parser.add_argument('-f', '--fields', default=",".join(PII_FIELDS),
+                        help="comma-separated fields to redact")
+    parser.add_argument('-r', '--redaction',
+                        default=RedactingFormatter.REDACTION)
+    parser.add_argument('-s', '--separator',
+                        default=RedactingFormatter.SEPARATOR)
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help="worker processes (defaults to CPU count)")
+    parser.add_argument('-c', '--chunk-size', type=int,
+                        default=DEFAULT_CHUNK_SIZE,
+                        help="approximate chunk size in bytes")
+    parser.add_argument('-p', '--pseudonymize', action='store_true',
+                        help="replace values with HMAC tokens keyed by "
+                        "PERSONAL_DATA_HMAC_KEY")
+    args = parser.parse_args()
+
+    key = None
+    if args.pseudonymize:
+        key = os.getenv('PERSONAL_DATA_HMAC_KEY', '').encode('utf-8')
+        if not key:
+            parser.error("PERSONAL_DATA_HMAC_KEY is not set")
+    fields = tuple(f for f in args.fields.split(',') if f)
+    if args.output is None:
+        redact_file(args.input, sys.stdout.buffer, fields, args.redaction,
+                    args.separator, args.workers, args.chunk_size, key)
+        return
+    with open(args.output, 'wb') as dst:
+        redact_file(args.input, dst, fields, args.redaction,
+                    args.separator, args.workers, args.chunk_size, key)
+
+
+if __name__ == "__main__":
+    main()
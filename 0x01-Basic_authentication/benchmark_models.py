@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Memory and startup benchmark for the models kept in DATA.
+
+Builds N objects from serialized records, the way load_from_file does,
+once with the current __slots__-based models and once with the original
+__dict__-based ones, each in a fresh process. Reports the resident size
+the objects add, per object and per million objects.
+
+Then times load_from_file on N objects stored as a JSON and as a binary
+snapshot.
+
+Usage:
+    ./benchmark_models.py [-n COUNT] [--only memory|startup]
+"""
+
+import argparse
+import gc
+import json
+import os
+import resource
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List
+
+from models import base
+from models.base import TIMESTAMP_FORMAT
+from models.user import User
+
+try:
+    from models.user_session import UserSession
+except ImportError:
+    UserSession = None
+
+
+class LegacyBase():
+    """ Original Base keeping attributes in __dict__ as datetimes. """
+
+    def __init__(self, *args: list, **kwargs: dict):
+        """
+        Initialize the instance from serialized attributes.
+        """
+        self.id = kwargs.get('id', str(uuid.uuid4()))
+        self.created_at = datetime.strptime(kwargs.get('created_at'),
+                                            TIMESTAMP_FORMAT)
+        self.updated_at = datetime.strptime(kwargs.get('updated_at'),
+                                            TIMESTAMP_FORMAT)
+
+
+class LegacyUser(LegacyBase):
+    """ Original User. """
+
+    def __init__(self, *args: list, **kwargs: dict):
+        """
+        Initialize the instance from serialized attributes.
+        """
+        super().__init__(*args, **kwargs)
+        self.email = kwargs.get('email')
+        self._password = kwargs.get('_password')
+        self.first_name = kwargs.get('first_name')
+        self.last_name = kwargs.get('last_name')
+
+
+class LegacyUserSession(LegacyBase):
+    """ Original UserSession. """
+
+    def __init__(self, *args: list, **kwargs: dict):
+        """
+        Initialize the instance from serialized attributes.
+        """
+        super().__init__(*args, **kwargs)
+        self.user_id = kwargs.get('user_id')
+        self.session_id = kwargs.get('session_id')
+
+
+def make_records(kind: str, count: int) -> List[dict]:
+    """
+    Builds serialized records like those in .db_<Class>.json.
+
+    Args:
+        kind (str): "user" or "session".
+        count (int): Number of records to build.
+
+    Returns:
+        List[dict]: The generated records.
+    """
+    records = []
+    for i in range(count):
+        record = {
+            'id': str(uuid.uuid4()),
+            'created_at': "2024-09-19T19:55:08",
+            'updated_at': "2024-09-19T19:55:08",
+        }
+        if kind == "user":
+            record.update({
+                'email': "user{}@example.com".format(i),
+                '_password': "{:064x}".format(i),
+                'first_name': "First{}".format(i),
+                'last_name': "Last{}".format(i),
+            })
+        else:
+            record.update({
+                'user_id': str(uuid.uuid4()),
+                'session_id': str(uuid.uuid4()),
+            })
+        records.append(record)
+    return records
+
+
+def resident_size() -> int:
+    """
+    Returns the current resident set size of the process in bytes.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        # Peak size in kilobytes, which only grows while objects are built
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def measure(case: str, count: int) -> int:
+    """
+    Builds count objects for a case and returns the resident size added.
+
+    Args:
+        case (str): The name of a case returned by cases().
+        count (int): Number of objects to build.
+
+    Returns:
+        int: Resident bytes held by the objects.
+    """
+    model, kind = cases()[case]
+    records = make_records(kind, count)
+    gc.collect()
+    before = resident_size()
+    objs = [model(**record) for record in records]
+    gc.collect()
+    size = resident_size() - before
+    del objs
+    return size
+
+
+def cases() -> Dict[str, tuple]:
+    """
+    Returns the benchmark cases as {name: (model, record kind)}.
+    """
+    models = {
+        "User": (User, "user"),
+        "User[legacy]": (LegacyUser, "user"),
+    }
+    if UserSession is not None:
+        models["UserSession"] = (UserSession, "session")
+        models["UserSession[legacy]"] = (LegacyUserSession, "session")
+    return models
+
+
+def measure_load(case: str, count: int, snapshot_format: str,
+                 repeat: int = 3) -> float:
+    """
+    Times load_from_file of count objects in a snapshot format.
+
+    Args:
+        case (str): The name of a non-legacy case returned by cases().
+        count (int): Number of objects in the snapshot.
+        snapshot_format (str): "json" or "binary".
+        repeat (int): Number of loads; the fastest one is reported.
+
+    Returns:
+        float: The load time in seconds.
+    """
+    model, kind = cases()[case]
+    records = make_records(kind, count)
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        with open(model._snapshot_path("json"), 'w') as f:
+            json.dump({record['id']: record for record in records}, f)
+        del records
+        base.SNAPSHOT_FORMAT = snapshot_format
+        if snapshot_format != "json":
+            model.load_from_file()
+            model.save_to_file()
+            os.remove(model._snapshot_path("json"))
+        best = None
+        for _ in range(repeat):
+            gc.collect()
+            start = time.perf_counter()
+            model.load_from_file()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        assert model.count() == count
+        os.chdir("/")
+    return best
+
+
+def run(func: Callable, *args):
+    """
+    Runs func in a fresh process so each case starts from a clean heap.
+    """
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        return pool.submit(func, *args).result()
+
+
+def main():
+    """
+    Runs every case and prints the memory held per object and load times.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument('-n', '--count', type=int, default=200000,
+                        help="objects built per case")
+    parser.add_argument('--only', choices=("memory", "startup"),
+                        help="run a single section")
+    args = parser.parse_args()
+
+    if args.only in (None, "memory"):
+        print("{:<24} {:>12} {:>16}".format(
+            "case", "bytes/obj", "MiB per million"))
+        for name in cases():
+            size = run(measure, name, args.count)
+            per_object = size / args.count
+            print("{:<24} {:>12,.1f} {:>16,.1f}".format(
+                name, per_object, per_object * 1e6 / (1 << 20)))
+
+    if args.only in (None, "startup"):
+        print("{:<24} {:>12} {:>16}".format(
+            "load_from_file", "ms", "us/obj"))
+        for name in cases():
+            if name.endswith("[legacy]"):
+                continue
+            for snapshot_format in ("json", "binary"):
+                elapsed = run(measure_load, name, args.count,
+                              snapshot_format)
+                print("{:<24} {:>12,.1f} {:>16,.2f}".format(
+                    "{}[{}]".format(name, snapshot_format), elapsed * 1e3,
+                    elapsed * 1e6 / args.count))
+
+
+if __name__ == "__main__":
+    main()
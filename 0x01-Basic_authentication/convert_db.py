@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Command-line tool to convert model data between storage formats.
+
+Loads each model from its files, the most recent snapshot among
+.db_<Class>.json and .db_<Class>.bin along with any pending journal, or
+from the SQLite database, and writes it in the requested format. The
+source is left in place; load_from_file always picks the most recently
+written snapshot.
+
+Usage:
+    ./convert_db.py --to binary [User ...]
+    ./convert_db.py --to sqlite
+    ./convert_db.py --from sqlite --to json
+"""
+
+import argparse
+
+from models import base
+from models.user import User
+
+try:
+    from models.user_session import UserSession
+except ImportError:
+    UserSession = None
+
+MODELS = {model.__name__: model
+          for model in (User, UserSession) if model is not None}
+
+
+def convert(model: type, source: str, target: str) -> int:
+    """
+    Writes the objects of a model in another format.
+
+    Args:
+        model (type): The Base subclass to convert.
+        source (str): "files" or "sqlite".
+        target (str): "json", "binary" or "sqlite".
+
+    Returns:
+        int: The number of objects written.
+    """
+    files = base.FileStorage()
+    if source == "sqlite":
+        objs = base.SQLiteStorage().search(model, {})
+        base.DATA[model.__name__] = {}
+        for obj in objs:
+            model._store(obj)
+    else:
+        files.load(model)
+        objs = list(base.DATA[model.__name__].values())
+    if target == "sqlite":
+        base.SQLiteStorage().save_many(objs)
+    else:
+        base.SNAPSHOT_FORMAT = target
+        files.save_all(model)
+    return len(objs)
+
+
+def main():
+    """
+    Parses the command line and converts the requested models.
+    """
+    parser = argparse.ArgumentParser(
+        description="Convert model data between JSON, binary and SQLite.")
+    parser.add_argument('models', nargs='*', metavar='model',
+                        help="models to convert, among {} (defaults to "
+                        "all)".format(", ".join(MODELS)))
+    parser.add_argument('--from', dest='source', default="files",
+                        choices=("files", "sqlite"),
+                        help="where to read the objects (default: files)")
+    parser.add_argument('--to', required=True,
+                        choices=("json", "binary", "sqlite"),
+                        help="format to write")
+    args = parser.parse_args()
+
+    for name in args.models:
+        if name not in MODELS:
+            parser.error("unknown model: {}".format(name))
+    for name in args.models or MODELS:
+        count = convert(MODELS[name], args.source, args.to)
+        target = base.SQLITE_PATH if args.to == "sqlite" else \
+            MODELS[name]._snapshot_path(args.to)
+        print("{}: {} objects -> {}".format(name, count, target))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+""" Tests of the journal, batches, write-behind and SQLite storage
+"""
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from models import base
+from models.base import Base
+from models.user import User
+
+
+class Note(Base):
+    """ Second model, to change two classes in one batch
+    """
+    __slots__ = ('text',)
+
+    def __init__(self, *args: list, **kwargs: dict):
+        """ Initialize a Note instance
+        """
+        super().__init__(*args, **kwargs)
+        self.text = kwargs.get('text')
+
+
+class StorageTestCase(unittest.TestCase):
+    """ Runs each test in an empty directory with a fresh storage
+    """
+    STORAGE = "file"
+    WRITE_BEHIND_MS = 0
+
+    def setUp(self):
+        """ Switch to a temporary directory and reset the model state
+        """
+        cwd = os.getcwd()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        os.chdir(tmp.name)
+        self.addCleanup(os.chdir, cwd)
+        storage = {
+            "sqlite": base.SQLiteStorage,
+        }.get(self.STORAGE, base.FileStorage)()
+        state = {
+            'STORAGE': self.STORAGE,
+            'WRITE_BEHIND_MS': self.WRITE_BEHIND_MS,
+            'JOURNAL_COMPACT_SIZE': 1 << 20,
+            '_STORAGE': storage,
+            'DATA': {},
+            'INDEXES': {},
+            'INDEXED_VALUES': {},
+            '_DIRTY': {},
+        }
+        for name, value in state.items():
+            patcher = mock.patch.object(base, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(base.flush)
+
+    def emails(self) -> list:
+        """ Sorted emails of the stored users
+        """
+        return sorted(user.email for user in User.all())
+
+    def emails_on_disk(self) -> list:
+        """ Sorted emails of the users in the files
+        """
+        return sorted(user.email for user in User._read_files().values())
+
+    @staticmethod
+    def in_thread(func):
+        """ Run func in another thread and wait for it
+        """
+        thread = threading.Thread(target=func)
+        thread.start()
+        thread.join()
+
+
+class TestJournal(StorageTestCase):
+    """ Tests of the journal storage
+    """
+    STORAGE = "journal"
+
+    def test_torn_write(self):
+        """ Records appended after a torn line survive a restart
+        """
+        User.load_from_file()
+        User(email="a@x").save()
+        with open(User._journal_path(), 'a') as f:
+            f.write('{"op": "save", "obj": {"id": "torn')
+        User.load_from_file()
+        self.assertEqual(self.emails(), ["a@x"])
+        User(email="b@x").save()
+        User(email="c@x").save()
+        User.load_from_file()
+        self.assertEqual(self.emails(), ["a@x", "b@x", "c@x"])
+
+    def test_torn_write_compacted(self):
+        """ Compaction keeps the records around a torn line
+        """
+        User.load_from_file()
+        User(email="a@x").save()
+        with open(User._journal_path(), 'a') as f:
+            f.write('{"op": "remove", "id"')
+        User.load_from_file()
+        User(email="b@x").save()
+        User._compact()
+        self.assertFalse(os.path.exists(User._journal_path()))
+        User.load_from_file()
+        self.assertEqual(self.emails(), ["a@x", "b@x"])
+
+
+class TestBatch(StorageTestCase):
+    """ Tests of Base.batch() with the file storage
+    """
+
+    def setUp(self):
+        """ Store two users
+        """
+        super().setUp()
+        User.load_from_file()
+        self.a = User(email="a@x")
+        self.a.save()
+        self.b = User(email="b@x")
+        self.b.save()
+
+    def change(self):
+        """ Add, change and remove users
+        """
+        User(email="uncommitted@x").save()
+        self.a.first_name = "Changed"
+        self.a.save()
+        self.b.remove()
+
+    def test_rollback_with_concurrent_writer(self):
+        """ A save from another thread does not write an open batch
+        """
+        with self.assertRaises(RuntimeError):
+            with User.batch():
+                self.change()
+                self.in_thread(lambda: User(email="other@x").save())
+                self.assertEqual(self.emails_on_disk(),
+                                 ["a@x", "b@x", "other@x"])
+                raise RuntimeError
+        self.assertEqual(self.emails(), ["a@x", "b@x", "other@x"])
+        self.assertIsNone(User.get(self.a.id).first_name)
+        User.load_from_file()
+        self.assertEqual(self.emails(), ["a@x", "b@x", "other@x"])
+        self.assertIsNone(User.get(self.a.id).first_name)
+
+    def test_rollback_keeps_other_batches(self):
+        """ Rolling back leaves the open batch of another thread alone
+        """
+        def other_batch():
+            with User.batch():
+                User(email="other@x").save()
+                started.set()
+                rolled_back.wait()
+
+        started, rolled_back = threading.Event(), threading.Event()
+        thread = threading.Thread(target=other_batch)
+        thread.start()
+        started.wait()
+        with self.assertRaises(RuntimeError):
+            with User.batch():
+                self.change()
+                raise RuntimeError
+        rolled_back.set()
+        thread.join()
+        self.assertEqual(self.emails(), ["a@x", "b@x", "other@x"])
+        self.assertEqual(self.emails_on_disk(), ["a@x", "b@x", "other@x"])
+
+    def test_commit(self):
+        """ The changes of a batch are written when it exits
+        """
+        with User.batch():
+            self.change()
+            self.in_thread(lambda: User(email="other@x").save())
+        self.assertEqual(self.emails_on_disk(),
+                         ["a@x", "other@x", "uncommitted@x"])
+        self.assertEqual(User._read_files()[self.a.id].first_name, "Changed")
+
+
+class TestJournalBatch(TestBatch):
+    """ Tests of Base.batch() with the journal storage
+    """
+    STORAGE = "journal"
+
+
+class TestWriteBehind(StorageTestCase):
+    """ Tests of flush() with the write-behind file storage
+    """
+    # Long enough for the tests to decide when changes are flushed
+    WRITE_BEHIND_MS = 60000
+
+    def test_flush(self):
+        """ Changes are queued until flush() writes them
+        """
+        User.load_from_file()
+        User(email="a@x").save()
+        User(email="b@x").save()
+        self.assertEqual(self.emails_on_disk(), [])
+        base.flush()
+        self.assertEqual(self.emails_on_disk(), ["a@x", "b@x"])
+        self.assertEqual(base._DIRTY, {})
+
+    def test_flush_during_batch(self):
+        """ flush() leaves out the changes of an open batch
+        """
+        User.load_from_file()
+        a = User(email="a@x")
+        a.save()
+        base.flush()
+        with self.assertRaises(RuntimeError):
+            with User.batch():
+                User(email="uncommitted@x").save()
+                a.first_name = "Changed"
+                a.save()
+                User(email="other@x").save()
+                self.in_thread(base.flush)
+                self.assertEqual(self.emails_on_disk(), ["a@x"])
+                raise RuntimeError
+        self.assertEqual(self.emails(), ["a@x"])
+        self.assertIsNone(User.get(a.id).first_name)
+
+    def test_rollback_with_queued_changes(self):
+        """ Rolling back keeps the changes queued before the batch
+        """
+        User.load_from_file()
+        a = User(email="a@x")
+        a.save()
+        with self.assertRaises(RuntimeError):
+            with User.batch():
+                User(email="uncommitted@x").save()
+                a.first_name = "Changed"
+                a.save()
+                raise RuntimeError
+        self.assertEqual(self.emails(), ["a@x"])
+        self.assertIsNone(User.get(a.id).first_name)
+        base.flush()
+        User.load_from_file()
+        self.assertEqual(self.emails(), ["a@x"])
+        self.assertIsNone(User.get(a.id).first_name)
+
+
+class TestSQLite(StorageTestCase):
+    """ Tests of Base.batch() with the SQLite storage
+    """
+    STORAGE = "sqlite"
+
+    def setUp(self):
+        """ Create the table of users only
+        """
+        super().setUp()
+        self.addCleanup(lambda: base._STORAGE._connection().close())
+        User.load_from_file()
+
+    def test_rollback_creating_table(self):
+        """ Creating a table in a batch does not commit the batch so far
+        """
+        with self.assertRaises(RuntimeError):
+            with User.batch():
+                User(email="a@x").save()
+                Note(text="first note").save()
+                raise RuntimeError
+        self.assertEqual(User.count(), 0)
+        self.assertEqual(Note.count(), 0)
+        Note(text="second note").save()
+        self.assertEqual([note.text for note in Note.all()], ["second note"])
+
+    def test_commit_creating_table(self):
+        """ Tables created in a batch are kept when it commits
+        """
+        with User.batch():
+            User(email="a@x").save()
+            Note(text="note").save()
+        counts = []
+        self.in_thread(lambda: counts.append(Note.count()))
+        self.assertEqual(counts, [1])
+        self.assertEqual(self.emails(), ["a@x"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -29,17 +29,16 @@ class SessionDBAuth(SessionExpAuth):
 
         # Load UserSession from the database
         try:
-            all_sessions = UserSession.all()
-            for session in all_sessions:
-                if session.session_id == session_id:
-                    # Check if the session has expired
-                    if self.session_duration <= 0:
-                        return session.user_id
-                    created_at = session.created_at
-                    if created_at + timedelta(
-                            seconds=self.session_duration) < datetime.now():
-                        return None
+            sessions = UserSession.search({'session_id': session_id})
+            for session in sessions:
+                # Check if the session has expired
+                if self.session_duration <= 0:
                     return session.user_id
+                created_at = session.created_at
+                if created_at + timedelta(
+                        seconds=self.session_duration) < datetime.now():
+                    return None
+                return session.user_id
         except (FileNotFoundError, KeyError):
             return None
 
@@ -55,17 +54,12 @@ class SessionDBAuth(SessionExpAuth):
             return False
 
         try:
-            all_sessions = UserSession.all()
-            # Filter out the session to delete
-            new_sessions = [
-                session for session in all_sessions
-                if session.session_id != session_id]
-
-            if len(new_sessions) == len(all_sessions):  # No session found
+            sessions = UserSession.search({'session_id': session_id})
+            if len(sessions) == 0:  # No session found
                 return False
 
-            # Save updated sessions to the file
-            UserSession.save_to_file(new_sessions)
+            for session in sessions:
+                session.remove()
             return True
         except (FileNotFoundError, KeyError):
             return False
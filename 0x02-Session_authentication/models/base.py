@@ -1,20 +1,158 @@
 #!/usr/bin/env python3
 """ Base module
 """
-from datetime import datetime
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from typing import TypeVar, List, Iterable
-from os import path
+from os import getenv, path
+import atexit
 import json
+import operator
+import os
+import pickle
+import shutil
+import sqlite3
+import threading
+import time
 import uuid
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+EPOCH = datetime(1970, 1, 1)
 DATA = {}
+# {class name: {attribute: {value: {id: object}}}} for indexed attributes
+INDEXES = {}
+# {class name: {id: {attribute: value}}}, the values each object is
+# currently indexed under
+INDEXED_VALUES = {}
+
+# "file" rewrites .db_<Class>.json on every change, "journal" appends
+# each change to .db_<Class>.journal and compacts it in the background,
+# "memory" keeps objects in DATA only and "sqlite" stores them in one
+# table per class of the MODELS_SQLITE_PATH database
+STORAGE = getenv('MODELS_STORAGE', 'file')
+SQLITE_PATH = getenv('MODELS_SQLITE_PATH', '.db_models.sqlite3')
+# Journal size in bytes that triggers a background compaction
+JOURNAL_COMPACT_SIZE = int(getenv('MODELS_JOURNAL_COMPACT_SIZE', 1 << 20))
+# When positive, changes are written by a background thread at most once
+# every this many milliseconds instead of on every save() and remove()
+WRITE_BEHIND_MS = int(getenv('MODELS_WRITE_BEHIND_MS', 0))
+# "json" writes snapshots to .db_<Class>.json, "binary" to .db_<Class>.bin
+# as pickled rows of attribute values that load without strptime
+SNAPSHOT_FORMAT = getenv('MODELS_SNAPSHOT_FORMAT', 'json')
+SNAPSHOT_VERSION = 2
+# Pinned so that snapshots stay readable across interpreter versions
+PICKLE_PROTOCOL = 4
+
+_LOCK = threading.RLock()
+_COMPACTING = set()
+# Number of save_to_file() calls per class, so that a compaction does not
+# replace a snapshot written while it was running
+_SNAPSHOT_WRITES = {}
+# Per-thread state of Base.batch(): nesting depth, deferred changes and
+# {class: {id: whether it was stored before}} for the objects it changed
+_BATCH = threading.local()
+# {thread ident: touched objects} of every open batch, left out of file
+# snapshots until the batch commits
+_OPEN_BATCHES = {}
+# Write-behind state: {class: [changes]} waiting for the flusher thread
+_DIRTY = {}
+# {class: [changes]} taken from _DIRTY by a flush and not yet on disk
+_FLUSHING = {}
+_DIRTY_EVENT = threading.Event()
+_FLUSH_LOCK = threading.Lock()
+_FLUSHER = None
+
+
+def flush():
+    """ Write every change still waiting for the write-behind thread
+
+    Snapshots are taken from DATA, leaving out the changes of the
+    batches still open, see Base._committed.
+    """
+    with _FLUSH_LOCK:
+        with _LOCK:
+            dirty = dict(_DIRTY)
+            _DIRTY.clear()
+            if STORAGE == "journal":
+                for model, records in dirty.items():
+                    model._append_journal(records)
+                return
+            _FLUSHING.update(dirty)
+            snapshots = {model: model._snapshot() for model in dirty}
+        # Serialize and write outside of the DATA lock
+        for model, snapshot in snapshots.items():
+            model._write_snapshot(snapshot)
+            with _LOCK:
+                model._drop_journal()
+                del _FLUSHING[model]
+
+
+def _write_behind():
+    """ Flush changes at most once every WRITE_BEHIND_MS milliseconds
+    """
+    while True:
+        _DIRTY_EVENT.wait()
+        _DIRTY_EVENT.clear()
+        time.sleep(WRITE_BEHIND_MS / 1000)
+        flush()
+
+
+atexit.register(flush)
+
+
+def _to_epoch(value: datetime) -> int:
+    """ Convert a naive UTC datetime to whole seconds since the epoch
+    """
+    return (value - EPOCH) // timedelta(seconds=1)
+
+
+def _from_epoch(seconds: int) -> datetime:
+    """ Convert seconds since the epoch to a naive UTC datetime
+    """
+    return EPOCH + timedelta(seconds=seconds)
+
+
+def _format_timestamp(value) -> str:
+    """ Format a stored timestamp, epoch seconds or a raw string
+    """
+    if type(value) is str:
+        return value
+    return _from_epoch(value).strftime(TIMESTAMP_FORMAT)
+
+
+def _line_break(f) -> bytes:
+    """ Newline to write first when appending after a torn last line
+    """
+    size = f.seek(0, os.SEEK_END)
+    if size == 0:
+        return b""
+    f.seek(size - 1)
+    return b"" if f.read(1) == b"\n" else b"\n"
+
+
+class _SnapshotUnpickler(pickle.Unpickler):
+    """ Unpickler of binary snapshots, which hold no class instances
+    """
+
+    def find_class(self, module: str, name: str):
+        """ Refuse every global, so a crafted file cannot run code
+        """
+        raise pickle.UnpicklingError(
+            "Unexpected global {}.{} in snapshot".format(module, name))
 
 
 class Base():
     """ Base class
     """
+    # Instances have no __dict__: subclasses list their attributes in
+    # __slots__ and timestamps are kept as epoch seconds, or as the raw
+    # string they were loaded from until first read. _json caches
+    # the public JSON form with the attribute values it was built from.
+    __slots__ = ('id', '_created_at', '_updated_at', '_json')
+    # Attributes searched by equality, looked up through a hash index
+    INDEXED_ATTRIBUTES = ()
 
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
@@ -24,16 +162,66 @@ class Base():
             DATA[s_class] = {}
 
         self.id = kwargs.get('id', str(uuid.uuid4()))
+        # Loaded timestamps are parsed on first access
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+            self._created_at = kwargs.get('created_at')
         else:
             self.created_at = datetime.utcnow()
-        if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
-        else:
+        if kwargs.get('updated_at') is None:
             self.updated_at = datetime.utcnow()
+        elif kwargs.get('updated_at') == kwargs.get('created_at'):
+            # Share the string of objects never updated since creation
+            self._updated_at = self._created_at
+        else:
+            self._updated_at = kwargs.get('updated_at')
+
+    @property
+    def created_at(self) -> datetime:
+        """ Getter of the creation time
+        """
+        value = self._created_at
+        if type(value) is str:
+            value = _to_epoch(datetime.strptime(value, TIMESTAMP_FORMAT))
+            self._created_at = value
+        return _from_epoch(value)
+
+    @created_at.setter
+    def created_at(self, value: datetime):
+        """ Setter of the creation time
+        """
+        self._created_at = _to_epoch(value)
+
+    @property
+    def updated_at(self) -> datetime:
+        """ Getter of the last update time
+        """
+        value = self._updated_at
+        if type(value) is str:
+            value = _to_epoch(datetime.strptime(value, TIMESTAMP_FORMAT))
+            self._updated_at = value
+        return _from_epoch(value)
+
+    @updated_at.setter
+    def updated_at(self, value: datetime):
+        """ Setter of the last update time
+        """
+        self._updated_at = _to_epoch(value)
+
+    @classmethod
+    def _attributes(cls) -> tuple:
+        """ Names of the attributes declared in __slots__ by subclasses
+        """
+        attributes = cls.__dict__.get('_slot_attributes')
+        if attributes is None:
+            attributes = tuple(
+                name for klass in reversed(cls.__mro__)
+                if klass is not Base and klass is not object
+                for name in klass.__dict__.get('__slots__', ())
+                if name not in ('__dict__', '__weakref__'))
+            cls._slot_attributes = attributes
+            cls._slot_fields = Base.__slots__[:3] + attributes
+            cls._slot_values = operator.attrgetter(*cls._slot_fields)
+        return attributes
 
     def __eq__(self, other: TypeVar('Base')) -> bool:
         """ Equality
@@ -47,10 +235,45 @@ class Base():
     def to_json(self, for_serialization: bool = False) -> dict:
         """ Convert the object a JSON dictionary
         """
-        result = {}
-        for key, value in self.__dict__.items():
-            if not for_serialization and key[0] == '_':
-                continue
+        if for_serialization:
+            return self._serialize()
+        return dict(self._public())
+
+    def _public(self) -> dict:
+        """ Cached public JSON form, not to be modified
+
+        The cache costs about 450 bytes per User on top of the ~135 of
+        the object, so only API responses fill it; snapshots, the journal
+        and SQLite call _serialize() and leave stored objects compact.
+        """
+        self.__class__._attributes()
+        values = self._slot_values(self)
+        extra = getattr(self, '__dict__', None)
+        if extra:
+            values = (values, tuple(extra.items()))
+        cached = getattr(self, '_json', None)
+        # Attributes are compared instead of tracked on every assignment,
+        # which would slow down each __init__ and load_from_file
+        if cached is None or cached[0] != values:
+            public = {key: value for key, value in self._serialize().items()
+                      if key[0] != '_'}
+            cached = (values, public)
+            self._json = cached
+        return cached[1]
+
+    def _serialize(self) -> dict:
+        """ Build the JSON dictionary of every attribute
+        """
+        result = {
+            'id': self.id,
+            'created_at': _format_timestamp(self._created_at),
+            'updated_at': _format_timestamp(self._updated_at),
+        }
+        items = [(key, getattr(self, key, None))
+                 for key in self.__class__._attributes()]
+        # Attributes of subclasses that do not declare __slots__
+        items.extend(getattr(self, '__dict__', {}).items())
+        for key, value in items:
             if type(value) is datetime:
                 result[key] = value.strftime(TIMESTAMP_FORMAT)
             else:
@@ -61,52 +284,434 @@ class Base():
     def load_from_file(cls):
         """ Load all objects from file
         """
-        s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
-            return
-
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+        _STORAGE.load(cls)
 
     @classmethod
     def save_to_file(cls):
         """ Save all objects to file
         """
-        s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
+        _STORAGE.save_all(cls)
+
+    @classmethod
+    def _snapshot_path(cls, snapshot_format: str = None) -> str:
+        """ Path of the snapshot file in the given or configured format
+        """
+        if (snapshot_format or SNAPSHOT_FORMAT) == "binary":
+            return ".db_{}.bin".format(cls.__name__)
+        return ".db_{}.json".format(cls.__name__)
+
+    @classmethod
+    def _latest_snapshot(cls) -> str:
+        """ Path of the most recently written snapshot, if any
+
+        Both formats may exist after a change of MODELS_SNAPSHOT_FORMAT;
+        the configured one wins when they are as recent.
+        """
+        latest = None
+        for file_path in (cls._snapshot_path(),
+                          cls._snapshot_path("json"),
+                          cls._snapshot_path("binary")):
+            try:
+                mtime = os.stat(file_path).st_mtime_ns
+            except OSError:
+                continue
+            if latest is None or mtime > latest[0]:
+                latest = (mtime, file_path)
+        return None if latest is None else latest[1]
+
+    @classmethod
+    def _read_snapshot(cls) -> dict:
+        """ Read the latest snapshot into a new {id: object} dictionary
+        """
+        objs = {}
+        file_path = cls._latest_snapshot()
+        if file_path is not None and file_path.endswith(".bin"):
+            cls._load_binary(file_path, objs)
+        elif file_path is not None:
+            with open(file_path, 'r') as f:
+                objs_json = json.load(f)
+                for obj_id, obj_json in objs_json.items():
+                    objs[obj_id] = cls(**obj_json)
+        return objs
+
+    @classmethod
+    def _load_binary(cls, file_path: str, objs: dict):
+        """ Load objects from a binary snapshot into objs
+        """
+        with open(file_path, 'rb') as f:
+            snapshot = _SnapshotUnpickler(f).load()
+        if snapshot.get('version') != SNAPSHOT_VERSION:
+            raise ValueError("Unsupported snapshot version in {}"
+                             .format(file_path))
+        rows = snapshot['rows']
+        if snapshot['fields'] is None:
+            # Classes with a __dict__ are stored as JSON dictionaries
+            for obj_json in rows:
+                obj = cls(**obj_json)
+                objs[obj.id] = obj
+            return
+        cls._attributes()
+        known = cls._slot_fields
+        fields = tuple(snapshot['fields'])
+        if fields != known:
+            # Attributes added since the snapshot was written start as None
+            positions = [fields.index(name) if name in fields else None
+                         for name in known]
+            rows = [tuple(None if i is None else row[i] for i in positions)
+                    for row in rows]
+        new = cls.__new__
+        setattr_ = object.__setattr__
+        for row in rows:
+            obj = new(cls)
+            for name, value in zip(known, row):
+                setattr_(obj, name, value)
+            objs[row[0]] = obj
+
+    @classmethod
+    def _snapshot(cls, objs: dict = None):
+        """ Serialize all objects of the class, or the given {id: object}
+        """
+        if objs is None:
+            objs = cls._committed()
+        if SNAPSHOT_FORMAT == "binary":
+            if cls.__dictoffset__:
+                fields = None
+                rows = [obj._serialize() for obj in objs.values()]
+            else:
+                cls._attributes()
+                fields = cls._slot_fields
+                rows = list(map(cls._slot_values, objs.values()))
+            return {'version': SNAPSHOT_VERSION, 'fields': fields,
+                    'rows': rows}
         objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        for obj_id, obj in objs.items():
+            objs_json[obj_id] = obj._serialize()
+        return objs_json
+
+    @classmethod
+    def _committed(cls) -> dict:
+        """ The {id: object} of DATA without the changes of open batches
+
+        To be called with _LOCK held.
+        """
+        objs = DATA.get(cls.__name__, {})
+        touched = {}
+        for batch in _OPEN_BATCHES.values():
+            for obj_id, stored in batch.get(cls, {}).items():
+                touched[obj_id] = touched.get(obj_id, False) or stored
+        if not touched:
+            return objs
+        objs = dict(objs)
+        committed = cls._read_committed(touched)
+        for obj_id in touched:
+            if obj_id in committed:
+                objs[obj_id] = committed[obj_id]
+            else:
+                objs.pop(obj_id, None)
+        return objs
+
+    @classmethod
+    def _read_committed(cls, touched: dict) -> dict:
+        """ Committed state of the objects a batch touched, by ID
+
+        The files are read, with the changes the write-behind thread has
+        not written yet, only when the batch changed objects that were
+        already stored; objects it added have no committed state. Changes
+        being flushed may already be on disk: applying them again gives
+        the same objects.
+        """
+        if not any(touched.values()):
+            return {}
+        objs = cls._read_files()
+        for records in (_FLUSHING.get(cls, ()), _DIRTY.get(cls, ())):
+            for record in records:
+                cls._apply(record, objs)
+        return {obj_id: objs[obj_id] for obj_id in touched if obj_id in objs}
+
+    @classmethod
+    def _touch(cls, obj_id: str):
+        """ Record that the open batch of this thread changes an object
+        """
+        touched = getattr(_BATCH, 'touched', None)
+        if touched is not None:
+            touched.setdefault(cls, {}).setdefault(
+                obj_id, obj_id in DATA.get(cls.__name__, {}))
+
+    @classmethod
+    def _write_snapshot(cls, snapshot):
+        """ Atomically replace the snapshot file
+        """
+        os.replace(cls._dump_snapshot(snapshot), cls._snapshot_path())
+
+    @classmethod
+    def _dump_snapshot(cls, snapshot) -> str:
+        """ Write a snapshot to a temporary file and return its path
+        """
+        # Forked workers keep the parent's thread ident, so add the pid
+        tmp_path = "{}.{}.{}.tmp".format(cls._snapshot_path(), os.getpid(),
+                                         threading.get_ident())
+        if SNAPSHOT_FORMAT == "binary":
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(snapshot, f, PICKLE_PROTOCOL)
+        else:
+            with open(tmp_path, 'w') as f:
+                json.dump(snapshot, f)
+        return tmp_path
+
+    @classmethod
+    def _journal_path(cls) -> str:
+        """ Path of the append-only journal of the class
+        """
+        return ".db_{}.journal".format(cls.__name__)
+
+    @classmethod
+    def _read_files(cls) -> dict:
+        """ Read the snapshot and the journal into an {id: object} dict
+        """
+        objs = cls._read_snapshot()
+        # Replay changes not yet compacted into the snapshot
+        journal_path = cls._journal_path()
+        cls._replay(journal_path + ".compacting", objs)
+        cls._replay(journal_path, objs)
+        return objs
+
+    @classmethod
+    def _drop_journal(cls):
+        """ Remove the journal files once a snapshot includes them
+        """
+        journal_path = cls._journal_path()
+        for old_path in (journal_path + ".compacting", journal_path):
+            if path.exists(old_path):
+                os.remove(old_path)
+
+    @classmethod
+    def _replay(cls, journal_path: str, objs: dict):
+        """ Apply the records of a journal file to an {id: object} dict
+        """
+        if not path.exists(journal_path):
+            return
+        with open(journal_path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Torn write; appends after it start on a new line
+                    continue
+                cls._apply(record, objs)
+
+    @classmethod
+    def _apply(cls, record: dict, objs: dict):
+        """ Apply one change record to an {id: object} dict
+        """
+        if record.get('op') == "remove":
+            objs.pop(record.get('id'), None)
+        else:
+            obj = cls(**record.get('obj'))
+            objs[obj.id] = obj
+
+    @classmethod
+    def _append_journal(cls, records: List[dict]):
+        """ Append changes to the journal in a single write
+        """
+        journal_path = cls._journal_path()
+        lines = "".join(json.dumps(record) + "\n" for record in records)
+        with _LOCK:
+            with open(journal_path, 'a+b') as f:
+                f.write(_line_break(f) + lines.encode())
+                size = f.tell()
+            if size >= JOURNAL_COMPACT_SIZE and \
+                    cls.__name__ not in _COMPACTING:
+                _COMPACTING.add(cls.__name__)
+                threading.Thread(target=cls._compact, daemon=True).start()
+
+    @classmethod
+    def _compact(cls):
+        """ Fold the journal into a new snapshot
+
+        The snapshot is rebuilt from the files rather than from DATA,
+        which may hold changes of a batch that is not committed yet.
+        """
+        s_class = cls.__name__
+        journal_path = cls._journal_path()
+        compacting_path = journal_path + ".compacting"
+        try:
+            with _LOCK:
+                # Rotate the journal: new changes go to a fresh file
+                if path.exists(compacting_path):
+                    with open(journal_path, 'rb') as src, \
+                            open(compacting_path, 'a+b') as dst:
+                        dst.write(_line_break(dst))
+                        shutil.copyfileobj(src, dst)
+                    os.remove(journal_path)
+                else:
+                    os.replace(journal_path, compacting_path)
+                writes = _SNAPSHOT_WRITES.get(s_class, 0)
+            objs = cls._read_snapshot()
+            cls._replay(compacting_path, objs)
+            tmp_path = cls._dump_snapshot(cls._snapshot(objs))
+            with _LOCK:
+                if _SNAPSHOT_WRITES.get(s_class, 0) == writes:
+                    os.replace(tmp_path, cls._snapshot_path())
+                    os.remove(compacting_path)
+                else:
+                    # save_to_file() already wrote every change
+                    os.remove(tmp_path)
+        finally:
+            _COMPACTING.discard(cls.__name__)
+
+    @classmethod
+    def _store(cls, obj: TypeVar('Base')):
+        """ Put an object in DATA and index its current values
+        """
+        s_class = cls.__name__
+        DATA[s_class][obj.id] = obj
+        indexes = INDEXES.setdefault(s_class, {})
+        indexed = INDEXED_VALUES.setdefault(s_class, {})
+        old_values = indexed.get(obj.id, {})
+        values = {}
+        for attr in cls.INDEXED_ATTRIBUTES:
+            value = getattr(obj, attr, None)
+            try:
+                hash(value)
+            except TypeError:
+                continue
+            values[attr] = value
+            index = indexes.setdefault(attr, {})
+            if attr in old_values:
+                if old_values[attr] == value:
+                    # Unchanged, keep its position in the bucket
+                    index[value][obj.id] = obj
+                    continue
+                cls._unindex(attr, old_values[attr], obj.id)
+            index.setdefault(value, {})[obj.id] = obj
+        for attr in old_values.keys() - values.keys():
+            cls._unindex(attr, old_values[attr], obj.id)
+        indexed[obj.id] = values
+
+    @classmethod
+    def _discard(cls, obj_id: str):
+        """ Drop an object from DATA and from the indexes
+        """
+        s_class = cls.__name__
+        DATA[s_class].pop(obj_id, None)
+        old_values = INDEXED_VALUES.get(s_class, {}).pop(obj_id, {})
+        for attr, value in old_values.items():
+            cls._unindex(attr, value, obj_id)
+
+    @classmethod
+    def _unindex(cls, attr: str, value, obj_id: str):
+        """ Remove one object ID from an index bucket
+        """
+        index = INDEXES[cls.__name__][attr]
+        bucket = index.get(value)
+        if bucket is None:
+            return
+        bucket.pop(obj_id, None)
+        if len(bucket) == 0:
+            del index[value]
+
+    @classmethod
+    def _persist(cls, record: dict):
+        """ Write one change to storage, or defer it inside a batch
+        """
+        pending = getattr(_BATCH, 'pending', None)
+        if pending is not None:
+            pending.setdefault(cls, []).append(record)
+            return
+        cls._commit([record])
+
+    @classmethod
+    def _commit(cls, records: List[dict]):
+        """ Write changes now, or hand them to the write-behind thread
+        """
+        global _FLUSHER
+        if WRITE_BEHIND_MS <= 0:
+            cls._write(records)
+            return
+        with _LOCK:
+            _DIRTY.setdefault(cls, []).extend(records)
+            if _FLUSHER is None or not _FLUSHER.is_alive():
+                _FLUSHER = threading.Thread(target=_write_behind,
+                                            daemon=True)
+                _FLUSHER.start()
+        _DIRTY_EVENT.set()
+
+    @classmethod
+    def _write(cls, records: List[dict]):
+        """ Write changes of the class to storage
+        """
+        if STORAGE == "journal":
+            cls._append_journal(records)
+        else:
+            cls.save_to_file()
+
+    @classmethod
+    @contextmanager
+    def batch(cls):
+        """ Defer writes to storage until the outermost batch exits
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+        Each class changed in the batch is then written once. Until
+        then, file snapshots written by other threads keep the committed
+        state of the objects saved or removed in the batch; attributes
+        set on a stored object are shared as soon as they are set, as
+        outside of a batch. If the batch raises, file storage puts back
+        the committed state of those objects and SQLite rolls back its
+        transaction; memory storage keeps the changes.
+        """
+        depth = getattr(_BATCH, 'depth', 0)
+        ident = threading.get_ident()
+        if depth == 0:
+            _BATCH.pending = {}
+            _BATCH.touched = {}
+            with _LOCK:
+                _OPEN_BATCHES[ident] = _BATCH.touched
+        _BATCH.depth = depth + 1
+        try:
+            yield
+        except BaseException:
+            if depth == 0:
+                pending, _BATCH.pending = _BATCH.pending, None
+                try:
+                    _STORAGE.rollback(pending)
+                finally:
+                    with _LOCK:
+                        _OPEN_BATCHES.pop(ident, None)
+            raise
+        else:
+            if depth == 0:
+                pending, _BATCH.pending = _BATCH.pending, None
+                with _LOCK:
+                    _OPEN_BATCHES.pop(ident, None)
+                _STORAGE.commit(pending)
+        finally:
+            _BATCH.depth = depth
+            if depth == 0:
+                _BATCH.touched = None
+
+    @classmethod
+    def bulk_save(cls, objs: Iterable[TypeVar('Base')]):
+        """ Save many objects with a single write per class
+        """
+        with cls.batch():
+            for obj in objs:
+                obj.save()
 
     def save(self):
         """ Save current object
         """
-        s_class = self.__class__.__name__
         self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        _STORAGE.save(self)
 
     def remove(self):
         """ Remove object
         """
-        s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        _STORAGE.remove(self)
 
     @classmethod
     def count(cls) -> int:
         """ Count all objects
         """
-        s_class = cls.__name__
-        return len(DATA[s_class].keys())
+        return _STORAGE.count(cls)
 
     @classmethod
     def all(cls) -> Iterable[TypeVar('Base')]:
@@ -118,20 +723,389 @@ class Base():
     def get(cls, id: str) -> TypeVar('Base'):
         """ Return one object by ID
         """
-        s_class = cls.__name__
-        return DATA[s_class].get(id)
+        return _STORAGE.get(cls, id)
 
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
         """
+        return _STORAGE.search(cls, attributes)
+
+
+def _matches(obj: Base, attributes: dict) -> bool:
+    """ Whether an object has every attribute value of a search
+    """
+    for k, v in attributes.items():
+        if (getattr(obj, k) != v):
+            return False
+    return True
+
+
+class Storage(ABC):
+    """ Where Base objects live, selected by MODELS_STORAGE
+    """
+
+    @abstractmethod
+    def load(self, cls: type):
+        """ Load all objects of a class from storage
+        """
+
+    @abstractmethod
+    def save_all(self, cls: type):
+        """ Write all objects of a class to storage
+        """
+
+    @abstractmethod
+    def save(self, obj: Base):
+        """ Insert or update one object
+        """
+
+    @abstractmethod
+    def remove(self, obj: Base) -> bool:
+        """ Delete one object, returning whether it was stored
+        """
+
+    @abstractmethod
+    def count(self, cls: type) -> int:
+        """ Number of objects of a class
+        """
+
+    @abstractmethod
+    def get(self, cls: type, obj_id: str) -> Base:
+        """ One object by ID, or None
+        """
+
+    @abstractmethod
+    def search(self, cls: type, attributes: dict) -> List[Base]:
+        """ Objects of a class whose attributes match
+        """
+
+    def commit(self, pending: dict):
+        """ Make the changes of a Base.batch() durable
+        """
+
+    def rollback(self, pending: dict):
+        """ Undo what can be undone of a failed Base.batch()
+        """
+
+
+class MemoryStorage(Storage):
+    """ Objects kept in DATA, with hash indexes on INDEXED_ATTRIBUTES
+    """
+
+    def load(self, cls: type):
+        """ Nothing to load: keep the objects already in DATA
+        """
+        DATA.setdefault(cls.__name__, {})
+
+    def save_all(self, cls: type):
+        """ Nothing to write
+        """
+
+    def save(self, obj: Base):
+        """ Store the object and index its current values
+        """
+        with _LOCK:
+            obj.__class__._store(obj)
+
+    def remove(self, obj: Base) -> bool:
+        """ Drop the object from DATA and from the indexes
+        """
+        cls = obj.__class__
+        with _LOCK:
+            if DATA[cls.__name__].get(obj.id) is None:
+                return False
+            cls._discard(obj.id)
+            return True
+
+    def count(self, cls: type) -> int:
+        """ Number of objects in DATA
+        """
+        return len(DATA[cls.__name__].keys())
+
+    def get(self, cls: type, obj_id: str) -> Base:
+        """ Lookup in DATA
+        """
+        return DATA[cls.__name__].get(obj_id)
+
+    def search(self, cls: type, attributes: dict) -> List[Base]:
+        """ Scan DATA, or an index bucket when an indexed attribute is set
+
+        Indexed attributes reflect the values objects had when last saved
+        or loaded; candidates are checked against every attribute.
+        """
+        s_class = cls.__name__
+        objs = DATA[s_class].values()
+        indexes = INDEXES.get(s_class, {})
+        for k in cls.INDEXED_ATTRIBUTES:
+            if k not in attributes:
+                continue
+            try:
+                bucket = indexes.get(k, {}).get(attributes[k], {})
+            except TypeError:
+                continue
+            objs = list(bucket.values())
+            break
+        if len(attributes) == 0:
+            return list(objs)
+        return [obj for obj in objs if _matches(obj, attributes)]
+
+
+class FileStorage(MemoryStorage):
+    """ Objects kept in DATA and persisted to .db_<Class> files
+
+    Snapshots use SNAPSHOT_FORMAT; with MODELS_STORAGE=journal, changes
+    are appended to a journal in between.
+    """
+
+    def load(self, cls: type):
+        """ Replace DATA with the snapshot and the journal on disk
+        """
         s_class = cls.__name__
-        def _search(obj):
-            if len(attributes) == 0:
-                return True
-            for k, v in attributes.items():
-                if (getattr(obj, k) != v):
-                    return False
+        if cls in _DIRTY:
+            flush()
+        with _LOCK:
+            objs = cls._read_files()
+            DATA[s_class] = {}
+            INDEXES[s_class] = {}
+            INDEXED_VALUES[s_class] = {}
+            for obj in objs.values():
+                cls._store(obj)
+
+    def save_all(self, cls: type):
+        """ Write a new snapshot and drop the journal it includes
+        """
+        with _LOCK:
+            snapshot = cls._snapshot()
+            cls._write_snapshot(snapshot)
+            _SNAPSHOT_WRITES[cls.__name__] = \
+                _SNAPSHOT_WRITES.get(cls.__name__, 0) + 1
+            # The snapshot now holds every journaled change
+            cls._drop_journal()
+
+    def save(self, obj: Base):
+        """ Store the object, then write or queue the change
+        """
+        with _LOCK:
+            obj.__class__._touch(obj.id)
+            super().save(obj)
+            obj.__class__._persist(
+                {'op': "save", 'obj': obj._serialize()})
+
+    def remove(self, obj: Base) -> bool:
+        """ Drop the object, then write or queue the change
+        """
+        with _LOCK:
+            obj.__class__._touch(obj.id)
+            if not super().remove(obj):
+                return False
+            obj.__class__._persist({'op': "remove", 'id': obj.id})
             return True
-        
-        return list(filter(_search, DATA[s_class].values()))
+
+    def commit(self, pending: dict):
+        """ Write the changes of each class at once
+        """
+        with _LOCK:
+            for model, records in pending.items():
+                model._commit(records)
+
+    def rollback(self, pending: dict):
+        """ Put back the committed state of the objects the batch changed
+
+        Objects it added are dropped and the others are read back from
+        the files, with the changes still queued for the write-behind
+        thread; the open batches of other threads are left alone.
+        """
+        with _LOCK:
+            for model, touched in _BATCH.touched.items():
+                committed = model._read_committed(touched)
+                for obj_id in touched:
+                    obj = committed.get(obj_id)
+                    if obj is not None:
+                        model._store(obj)
+                    elif obj_id in DATA.get(model.__name__, {}):
+                        model._discard(obj_id)
+
+
+class SQLiteStorage(Storage):
+    """ Objects stored as rows of one table per class, in WAL mode
+
+    Columns are the attributes declared in __slots__; other attributes
+    go to a JSON "_extra" column. Objects are built on each lookup, so
+    DATA stays empty and the dataset does not have to fit in memory.
+    """
+
+    def __init__(self, db_path: str = None):
+        """ Initialize the storage for a database file
+        """
+        self.db_path = db_path or SQLITE_PATH
+        self._local = threading.local()
+        # {class: fields} of the tables created and committed
+        self._columns = {}
+
+    def _connection(self) -> sqlite3.Connection:
+        """ Connection of the current thread and process
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _fields(self, cls: type) -> tuple:
+        """ Attribute columns of a class, creating its table if needed
+        """
+        fields = self._columns.get(cls)
+        if fields is not None:
+            return fields
+        # Tables created in the open batch of this thread
+        pending = getattr(self._local, 'columns', None)
+        if pending and cls in pending:
+            return pending[cls]
+        cls._attributes()
+        fields = ('id', 'created_at', 'updated_at') + cls._slot_attributes
+        table = cls.__name__
+        conn = self._connection()
+        conn.execute('CREATE TABLE IF NOT EXISTS "{}" ('
+                     '"id" TEXT PRIMARY KEY, "_extra" TEXT)'.format(table))
+        existing = {row[1] for row in
+                    conn.execute('PRAGMA table_info("{}")'.format(table))}
+        for name in fields:
+            if name not in existing:
+                conn.execute('ALTER TABLE "{}" ADD COLUMN "{}"'
+                             .format(table, name))
+        for name in cls.INDEXED_ATTRIBUTES:
+            if name in fields:
+                conn.execute('CREATE INDEX IF NOT EXISTS "{0}_{1}" '
+                             'ON "{0}" ("{1}")'.format(table, name))
+        if getattr(_BATCH, 'pending', None) is None:
+            conn.commit()
+            self._columns[cls] = fields
+        else:
+            # Committing would also commit the batch so far: the table is
+            # created with it, or again after a rollback
+            if pending is None:
+                pending = self._local.columns = {}
+            pending[cls] = fields
+        return fields
+
+    def _select(self, cls: type, where: str = "",
+                params: tuple = ()) -> List[Base]:
+        """ Objects built from the rows matching a WHERE clause
+        """
+        fields = self._fields(cls)
+        query = 'SELECT {}, "_extra" FROM "{}" {}'.format(
+            ", ".join('"{}"'.format(name) for name in fields),
+            cls.__name__, where)
+        objs = []
+        for row in self._connection().execute(query, params):
+            kwargs = dict(zip(fields, row))
+            if row[-1] is not None:
+                kwargs.update(json.loads(row[-1]))
+            objs.append(cls(**kwargs))
+        return objs
+
+    def _done(self):
+        """ Commit the change unless a Base.batch() is open
+        """
+        if getattr(_BATCH, 'pending', None) is None:
+            self._connection().commit()
+
+    def load(self, cls: type):
+        """ Create the table of the class if needed
+        """
+        self._fields(cls)
+
+    def save_all(self, cls: type):
+        """ Every change is already written
+        """
+        self._done()
+
+    def save(self, obj: Base):
+        """ Insert or replace the row of the object
+        """
+        self.save_many([obj])
+
+    def save_many(self, objs: Iterable[Base]):
+        """ Insert or replace the rows of objects in one transaction
+        """
+        conn = self._connection()
+        for obj in objs:
+            cls = obj.__class__
+            fields = self._fields(cls)
+            full = obj._serialize()
+            extra = {key: value for key, value in full.items()
+                     if key not in fields}
+            values = [full.get(name) for name in fields]
+            values.append(json.dumps(extra) if extra else None)
+            conn.execute(
+                'INSERT OR REPLACE INTO "{}" ({}, "_extra") VALUES ({})'
+                .format(cls.__name__,
+                        ", ".join('"{}"'.format(name) for name in fields),
+                        ", ".join("?" * (len(fields) + 1))),
+                values)
+        self._done()
+
+    def remove(self, obj: Base) -> bool:
+        """ Delete the row of the object
+        """
+        cls = obj.__class__
+        self._fields(cls)
+        cursor = self._connection().execute(
+            'DELETE FROM "{}" WHERE "id" = ?'.format(cls.__name__),
+            (obj.id,))
+        self._done()
+        return cursor.rowcount > 0
+
+    def count(self, cls: type) -> int:
+        """ Number of rows of the class
+        """
+        self._fields(cls)
+        return self._connection().execute(
+            'SELECT COUNT(*) FROM "{}"'.format(cls.__name__)).fetchone()[0]
+
+    def get(self, cls: type, obj_id: str) -> Base:
+        """ Lookup by primary key
+        """
+        objs = self._select(cls, 'WHERE "id" = ?', (obj_id,))
+        return objs[0] if objs else None
+
+    def search(self, cls: type, attributes: dict) -> List[Base]:
+        """ Filter on the columns in SQL, then check every attribute
+        """
+        fields = self._fields(cls)
+        # Timestamps are compared as datetimes, not as stored strings
+        columns = [k for k in attributes
+                   if k in fields and k not in ('created_at', 'updated_at')
+                   and type(attributes[k]) in (str, int, float, type(None))]
+        where = ""
+        if columns:
+            where = "WHERE " + " AND ".join(
+                '"{}" IS ?'.format(k) for k in columns)
+        objs = self._select(cls, where,
+                            tuple(attributes[k] for k in columns))
+        if len(attributes) == len(columns):
+            return objs
+        return [obj for obj in objs if _matches(obj, attributes)]
+
+    def commit(self, pending: dict):
+        """ Commit the transaction of the batch
+        """
+        self._connection().commit()
+        self._columns.update(getattr(self._local, 'columns', None) or {})
+        self._local.columns = None
+
+    def rollback(self, pending: dict):
+        """ Roll back the transaction of the batch
+        """
+        self._connection().rollback()
+        self._local.columns = None
+
+
+_STORAGE = {
+    "memory": MemoryStorage,
+    "sqlite": SQLiteStorage,
+}.get(STORAGE, FileStorage)()